@@ -0,0 +1,213 @@
+""" Benchmark the HUX propagators and the numerical methods on synthetic inner-boundary profiles.
+
+Every propagator and scheme/limiter pair is timed on a range of (nphi, nr) grids, results are
+reported in cells/sec and peak memory and written to a json file to track regressions.
+No network access or MAS data is needed.
+
+usage (from the repository root):
+    python benchmarks/bench_propagation.py --output bench_results.json
+    python benchmarks/bench_propagation.py --quick
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from code.hux_propagation import apply_hux_f_model, apply_hux_b_model, apply_hux_f_model_3d, \
+    apply_hux_b_model_3d, apply_forward_upwind_model, apply_backwards_upwind_model, HUXPlan, TimeDependentHUX
+from code.numerical_methods import apply_numerical_method, FORWARD_METHODS
+from code.flux_limiters import LIMITERS
+from code import numba_kernels
+
+NPHI_LIST = (128, 512, 1024, 4096)
+NR_LIST = (100, 1000, 5000)
+NTHETA = 16  # number of latitudes for the batched (_3d) propagators.
+OMEGA_ROT = (2 * np.pi) / (25.38 * 86400)
+R0 = 30 * 695700
+
+
+def synthetic_boundary(nphi, ntheta=None, seed=0):
+    """Synthetic vr profile at 30 Rs, fast and slow streams with a little noise.
+
+    :param nphi: number of longitude points.
+    :param ntheta: number of latitudes, None returns a 1d profile.
+    :param seed: random seed.
+    :return: vr (nphi) or (nphi x ntheta). units = (km/sec).
+    """
+    rng = np.random.default_rng(seed)
+    p = np.linspace(0, 2 * np.pi, nphi)
+    v = 400 + 250 * (np.tanh(4 * np.sin(2 * p)) + 1) / 2 + 10 * np.sin(7 * p)
+    if ntheta is None:
+        return v + rng.normal(0, 5, nphi)
+    return v[:, None] + rng.normal(0, 5, (nphi, ntheta))
+
+
+def synthetic_grid(nphi, nr, v_min=300.):
+    """Radial and longitude mesh spacing, the radial extent is capped at 30 Rs to 1 AU
+    and shrunk if needed so that every grid satisfies the courant condition.
+
+    :return: dr_vec, dp_vec (km, radians).
+    """
+    dp_vec = np.diff(np.linspace(0, 2 * np.pi, nphi))
+    dr_max = 0.9 * np.min(dp_vec) * v_min / OMEGA_ROT
+    dr = min((215 - 30) * 695700 / (nr - 1), dr_max)
+    return np.full(nr - 1, dr), dp_vec
+
+
+def cases(include_python=False):
+    """ return a list of (name, backend, setup) where setup(nphi, nr) returns a callable to time."""
+    out = []
+
+    def hux(fn, backend):
+        def setup(nphi, nr):
+            dr_vec, dp_vec = synthetic_grid(nphi, nr)
+            v = synthetic_boundary(nphi)
+            return lambda: fn(v, dr_vec, dp_vec, backend=backend)
+        return setup
+
+    def hux_3d(fn):
+        def setup(nphi, nr):
+            dr_vec, dp_vec = synthetic_grid(nphi, nr)
+            v = synthetic_boundary(nphi, NTHETA)
+            return lambda: fn(v, dr_vec, dp_vec)
+        return setup
+
+    def plan(nphi, nr):
+        dr_vec, dp_vec = synthetic_grid(nphi, nr)
+        v = synthetic_boundary(nphi)
+        hux_plan = HUXPlan(dr_vec, dp_vec)
+        return lambda: hux_plan.forward(v)
+
+    def plan_3d(nphi, nr):
+        dr_vec, dp_vec = synthetic_grid(nphi, nr)
+        v = synthetic_boundary(nphi, NTHETA).T
+        hux_plan = HUXPlan(dr_vec, dp_vec)
+        return lambda: hux_plan.forward(v)
+
+    def time_dependent(fraction):
+        # each update changes a contiguous fraction of the longitudes of one latitude, to compare with
+        # the full recompute of HUXPlan.forward_3d.
+        def setup(nphi, nr):
+            dr_vec, dp_vec = synthetic_grid(nphi, nr)
+            maps = [synthetic_boundary(nphi, NTHETA).T, synthetic_boundary(nphi, NTHETA).T]
+            cols = slice(nphi // 3, nphi // 3 + max(1, int(fraction * (nphi - 1))))
+            maps[1][NTHETA // 2, cols] += 20.
+            model = TimeDependentHUX(dr_vec, dp_vec)
+            model.update(maps[1])
+            count = [0]
+
+            def run():
+                count[0] += 1
+                model.update(maps[count[0] % 2])
+            return run
+        return setup
+
+    def numerical(method, limiter, direction, backend):
+        def setup(nphi, nr):
+            dr_vec, dp_vec = synthetic_grid(nphi, nr)
+            v = synthetic_boundary(nphi)
+            return lambda: apply_numerical_method(v, dr_vec, dp_vec, numerical_method=method,
+                                                  flux_function=limiter, direction=direction, backend=backend)
+        return setup
+
+    backends = ["numpy"] + (["python"] if include_python else [])
+    for backend in backends:
+        out.append(("apply_hux_f_model", backend, hux(apply_hux_f_model, backend)))
+        out.append(("apply_hux_b_model", backend, hux(apply_hux_b_model, backend)))
+        out.append(("apply_forward_upwind_model", backend, hux(apply_forward_upwind_model, backend)))
+        out.append(("apply_backwards_upwind_model", backend, hux(apply_backwards_upwind_model, backend)))
+    out.append(("apply_hux_f_model_3d", "numpy", hux_3d(apply_hux_f_model_3d)))
+    out.append(("apply_hux_b_model_3d", "numpy", hux_3d(apply_hux_b_model_3d)))
+    out.append(("HUXPlan.forward", "numpy", plan))
+    out.append(("HUXPlan.forward_3d", "numpy", plan_3d))
+    for fraction in (0.01, 0.1, 0.5):
+        out.append(("TimeDependentHUX.update_3d[" + str(fraction) + "]", "numpy", time_dependent(fraction)))
+
+    scheme_backends = ["numpy"] + ([] if numba_kernels.numba is None else ["numba"]) + backends[1:]
+    for backend in scheme_backends:
+        for method in FORWARD_METHODS:
+            for limiter in LIMITERS:
+                out.append(("apply_numerical_method[" + method + "," + limiter + ",f]", backend,
+                            numerical(method, limiter, "f", backend)))
+        for limiter in LIMITERS:
+            out.append(("apply_numerical_method[upwind_first_lax_wendroff," + limiter + ",b]", backend,
+                        numerical("upwind_first_lax_wendroff", limiter, "b", backend)))
+    return out
+
+
+def measure(run, repeat):
+    """ return the best wall time over repeat runs and the peak traced memory of one run (bytes)."""
+    # warm up, e.g. numba compilation.
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def git_revision():
+    """ return the current git commit, or None outside of a git repository."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json", help="json file the results are written to.")
+    parser.add_argument("--nphi", type=int, nargs="+", default=NPHI_LIST, help="longitude grid sizes.")
+    parser.add_argument("--nr", type=int, nargs="+", default=NR_LIST, help="radial grid sizes.")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the best one is kept.")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this string.")
+    parser.add_argument("--include-python", action="store_true", help="also time the per-cell python loops.")
+    parser.add_argument("--quick", action="store_true", help="smallest grids only, one timed run.")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.nphi, args.nr, args.repeat = [128], [100], 1
+
+    results = []
+    for name, backend, setup in cases(include_python=args.include_python):
+        if args.filter not in name:
+            continue
+        for nphi in args.nphi:
+            for nr in args.nr:
+                seconds, peak = measure(setup(nphi, nr), args.repeat)
+                ncells = nphi * nr * (NTHETA if "_3d" in name else 1)
+                results.append({"name": name, "backend": backend, "nphi": nphi, "nr": nr, "cells": ncells,
+                                "seconds": seconds, "cells_per_sec": ncells / seconds, "peak_memory_bytes": peak})
+                print("{:<62s} {:<7s} nphi={:<5d} nr={:<5d} {:12.4g} cells/s {:10.3f} MB".format(
+                    name, backend, nphi, nr, ncells / seconds, peak / 2 ** 20))
+
+    report = {"created": dt.datetime.now().isoformat(),
+              "git_revision": git_revision(),
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "numba": None if numba_kernels.numba is None else numba_kernels.numba.__version__,
+              "platform": platform.platform(),
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("results written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
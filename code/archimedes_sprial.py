@@ -6,45 +6,71 @@ import astropy.units as u
 
 
 def compute_phi_shift_forward(p, r, v, omega=(2 * np.pi) / (25.38 * 86400)):
-    # initialize phi shift matrix.
-    phi_shift_vec = np.zeros(len(r))
+    return trace_parker_spiral(p, r, v, omega_rot=omega)
 
-    # phi at index 0 is original phi grid
-    phi_shift_vec[0] = p
 
-    # delta r.
-    dr = np.mean(r[1:] - r[:-1])
+def trace_parker_spiral(phi0, r, v, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+    """Trace Parker spiral field lines from their footpoint longitudes, all lines at once.
 
-    # compute the phi shift for each idx in r.
-    for ii in range(0, len(r) - 1):
-        phi_shift = -(omega / v) * dr
-        phi_shift_vec[ii + 1] = phi_shift_vec[ii] + phi_shift
+    phi(r_i) = phi0 - omega_rot * sum_{k < i} (r_{k+1} - r_k) / v_k, the velocity of each radial step
+    is the one at its inner radius.
 
-    return phi_shift_vec
+    ex: field lines of a HUX-f solution v (nr x np) launched at every longitude of the grid p:
+        phi_lines = trace_parker_spiral(p, r, v.T)
+
+    :param phi0: float or 1d array (nlines), longitude of the field lines at r[0]. units = (radians).
+    :param r: 1d array (nr), radial grid. units = (km).
+    :param v: radial velocity, float, (nlines) one per line, (nr) one profile for all lines,
+              or (nlines x nr) one profile per line. units = (km/sec).
+    :param omega_rot: rotation rate of the sun. units = (1/sec).
+    :return: longitude of the field lines (nlines x nr), or (nr) for a single line. units = (radians).
+    """
+    phi0 = np.asarray(phi0, dtype=float)
+    r = np.asarray(r, dtype=float)
+    v = np.asarray(v, dtype=float)
+    # a velocity per line is constant along the line (a 1d v of length nr is a radial profile).
+    if v.ndim == 1 and len(v) != len(r):
+        v = v[:, None]
+
+    # phi shift of each radial step, then cumulative shift from r[0].
+    dphi = -(omega_rot * np.diff(r)) / np.broadcast_to(v, np.broadcast_shapes(v.shape, r.shape))[..., :-1]
+    shift = np.concatenate([np.zeros(dphi.shape[:-1] + (1,)), np.cumsum(dphi, axis=-1)], axis=-1)
+    return np.expand_dims(phi0, -1) + shift
 
 
 def ballistic_approximation_ulysses(r0_vec, rf_vec, phi_vec, vr_initial, omega_rot=(2 * np.pi) / (25.38 * 86400)):
-    res_ballistic_f = np.zeros(len(phi_vec))
-
-    for ii in range(len(phi_vec)):
-        # get current phi location.
-        phi_location = phi_vec[ii].to(u.rad).value
-        # corresponding r0 = 30rs.
-        r0 = ((r0_vec[ii]).to(u.km)).value
-        # final r location.
-        rf = (rf_vec[ii].to(u.km)).value
-        # vr0
-        curr_velocity = vr_initial[ii].value
-        # change in r.
-        dr = rf - r0
-        # change in phi.
-        delta_phi = (omega_rot * dr) / curr_velocity
-        # compute the phi shift
-        phi_shifted = phi_location - delta_phi
-        # force periodicity
-        res_ballistic_f[ii] = phi_shifted % (2 * np.pi)
-
-    return res_ballistic_f
+    return ballistic_mapping(r0_vec, rf_vec, phi_vec, vr_initial, omega_rot=omega_rot)
+
+
+def ballistic_mapping(r0, rf, phi, vr, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+    """Map points at rf back (or forward) along a constant velocity spiral to r0, for whole trajectories at once.
+
+    Every argument is either an astropy Quantity, converted once per array, or a plain array in the
+    units below. The arrays are broadcast together, e.g. (ntrajectories x npoints) batches.
+
+    :param r0: array, radius of the mapped points. units = (km).
+    :param rf: array, radius of the observations. units = (km).
+    :param phi: array, longitude of the observations. units = (radians).
+    :param vr: array, radial velocity. units = (km/sec).
+    :param omega_rot: rotation rate of the sun. units = (1/sec).
+    :return: array, longitude of the mapped points in [0, 2pi). units = (radians).
+    """
+    r0 = _to_value(r0, u.km)
+    rf = _to_value(rf, u.km)
+    phi = _to_value(phi, u.rad)
+    vr = _to_value(vr, u.km / u.s)
+
+    # change in phi.
+    delta_phi = (omega_rot * (rf - r0)) / vr
+    # force periodicity
+    return (phi - delta_phi) % (2 * np.pi)
+
+
+def _to_value(x, unit):
+    """ return x as a float array in unit, x is a Quantity or is already in unit."""
+    if isinstance(x, u.Quantity):
+        return x.to_value(unit)
+    return np.asarray(x, dtype=float)
 
 def cmap_spiral(nphi):
     # an array of parameters, each of our curves depend on a specific value of parameters.
@@ -0,0 +1,77 @@
+""" Ensemble uncertainty propagation, N perturbed inner boundaries are marched together as one (N x np) batch. """
+import numpy as np
+
+from code.numerical_methods import apply_numerical_method
+
+
+def perturb_boundary(r_initial, n_members, sigma=20., correlation_length=None, v_min=100., seed=None):
+    """Gaussian noise model of the inner boundary.
+
+    :param r_initial: 1d array, initial condition (vr0), the last point repeats the first. units = (km/sec).
+    :param n_members: number of realizations.
+    :param sigma: float or 1d array (np), standard deviation of the noise. units = (km/sec).
+    :param correlation_length: float, gaussian correlation length of the noise along phi, assuming a uniform
+                               phi grid, default = None (independent longitudes). units = (radians).
+    :param v_min: float, the realizations are clipped below v_min. units = (km/sec).
+    :param seed: random seed.
+    :return: realizations (n_members x np), periodic like r_initial. units = (km/sec).
+    """
+    r_initial = np.asarray(r_initial, dtype=float)
+    n = len(r_initial) - 1
+    noise = np.random.default_rng(seed).normal(0, 1, (n_members, n))
+
+    if correlation_length is not None:
+        # periodic gaussian smoothing in fourier space, rescaled to keep a unit variance.
+        k = 2 * np.pi * np.fft.rfftfreq(n, d=2 * np.pi / n)
+        kernel = np.exp(-0.5 * (k * correlation_length) ** 2)
+        noise = np.fft.irfft(np.fft.rfft(noise, axis=-1) * kernel, n=n, axis=-1)
+        noise = noise / np.std(noise)
+
+    noise = np.concatenate([noise, noise[:, :1]], axis=-1)
+    return np.maximum(r_initial + sigma * noise, v_min)
+
+
+def ensemble_statistics(dr_vec, dp_vec, r_out, members=None, r_initial=None, n_members=100, sigma=20.,
+                        correlation_length=None, seed=None, quantiles=(0.05, 0.5, 0.95), batch_size=256,
+                        return_members=False, **kwargs):
+    """Propagate an ensemble of inner boundaries with apply_numerical_method and summarize it at r_out.
+
+    The members are marched together in batches of batch_size and only the slices at r_out are kept,
+    so the memory is (N x len(r_out) x np) instead of N full (nr x np) matrices.
+
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param r_out: list of output radii. units = (km).
+    :param members: array (N x np), inner boundary realizations, default = perturb_boundary(r_initial, ...).
+    :param r_initial: 1d array, unperturbed inner boundary, used if members is None. units = (km/sec).
+    :param n_members: number of realizations generated, see perturb_boundary.
+    :param sigma: noise standard deviation, see perturb_boundary. units = (km/sec).
+    :param correlation_length: noise correlation length, see perturb_boundary. units = (radians).
+    :param seed: random seed, see perturb_boundary.
+    :param quantiles: list of quantiles in [0, 1].
+    :param batch_size: number of members marched together.
+    :param return_members: bool, also return the member slices at r_out.
+    :param kwargs: arguments of apply_numerical_method (r0, alpha, rh, numerical_method, flux_function ...),
+                   the backend must be vectorized ("auto", "numpy" or "numba").
+    :return: dict with "mean", "std" (len(r_out) x np), "quantiles" (len(quantiles) x len(r_out) x np)
+             and "members" (N x len(r_out) x np) if return_members.
+    """
+    if kwargs.get("backend") == "python":
+        raise ValueError("The python backend marches one profile at a time, use the numpy or numba backend.")
+    if members is None:
+        if r_initial is None:
+            raise ValueError("Either members or r_initial must be given.")
+        members = perturb_boundary(r_initial, n_members, sigma=sigma, correlation_length=correlation_length,
+                                   seed=seed)
+    members = np.atleast_2d(np.asarray(members, dtype=float))
+
+    # (len(r_out) x batch x np) for every batch of members.
+    v_out = np.concatenate([apply_numerical_method(members[i:i + batch_size], dr_vec, dp_vec, r_out=r_out, **kwargs)
+                            for i in range(0, len(members), batch_size)], axis=1)
+
+    stats = {"mean": np.mean(v_out, axis=1),
+             "std": np.std(v_out, axis=1),
+             "quantiles": np.quantile(v_out, quantiles, axis=1)}
+    if return_members:
+        stats["members"] = np.moveaxis(v_out, 1, 0)
+    return stats
@@ -0,0 +1,62 @@
+""" Flux-limiter functions for the high resolution numerical methods, evaluated on whole arrays. """
+
+import numpy as np
+
+
+def vanleer(theta):
+    """ van Leer flux-limiter. theta can be a float or an array."""
+    return (np.abs(theta) + theta) / (1 + np.abs(theta))
+
+
+def minmod(theta):
+    """ minmod flux-limiter. theta can be a float or an array."""
+    return np.maximum(0., np.minimum(1., theta))
+
+
+def superbee(theta):
+    """ superbee flux-limiter. theta can be a float or an array."""
+    return np.maximum(np.maximum(0., np.minimum(1., 2 * theta)), np.minimum(theta, 2.))
+
+
+def mc(theta):
+    """ monotonized central flux-limiter. theta can be a float or an array."""
+    return np.maximum(0., np.minimum(np.minimum((1 + theta) / 2, 2.), 2 * theta))
+
+
+# flux-limiters selectable by name, see register_limiter.
+LIMITERS = {"vanleer": vanleer, "minmod": minmod, "superbee": superbee, "mc": mc}
+
+
+def register_limiter(name, limiter):
+    """Add a flux-limiter so it can be selected by name, e.g. flux_function=name.
+    Write it with numpy functions (np.maximum, np.minimum, np.abs ...) rather than the
+    python max/min so it works on whole arrays and can be compiled by numba.
+
+    :param name: str, name of the flux-limiter.
+    :param limiter: function of theta, returns the flux-limiter value.
+    :return: None
+    """
+    LIMITERS[name] = limiter
+
+
+def get_limiter(limiter):
+    """ return the flux-limiter function registered as limiter (str), callables are returned as is."""
+    if callable(limiter):
+        return limiter
+    try:
+        return LIMITERS[limiter]
+    except KeyError:
+        raise ValueError("Unknown flux-limiter: " + str(limiter)) from None
+
+
+def smoothness_ratio(v_prev, v_curr, v_next):
+    """Smoothness of the wave, theta = (v[j] - v[j-1]) / (v[j+1] - v[j]).
+
+    :param v_prev: v[j-1], float or array.
+    :param v_curr: v[j], float or array.
+    :param v_next: v[j+1], float or array.
+    :return: theta, 0 where v[j+1] == v[j].
+    """
+    v_prev, v_curr, v_next = np.asarray(v_prev), np.asarray(v_curr), np.asarray(v_next)
+    theta = np.zeros(np.broadcast(v_prev, v_curr, v_next).shape)
+    return np.divide(v_curr - v_prev, v_next - v_curr, out=theta, where=v_next != v_curr)
@@ -0,0 +1,120 @@
+""" Discrete adjoint of the HUX-f upwind scheme: gradients of a misfit with respect to the inner boundary
+velocity and the hyper parameters (alpha, rh, r0, omega_rot) for about the cost of two forward runs. """
+import numpy as np
+
+from code.hux_propagation import _hux_f_step, _radial_grid
+
+
+def hux_f_vjp(r_initial, dr_vec, dp_vec, r_out, grad_out, r0=30 * 695700, alpha=0.15, rh=50 * 695700,
+              add_v_acc=True, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+    """Back-propagate the gradient of a function of the HUX-f slices at r_out (vector-Jacobian product).
+
+    The forward run is the upwind recursion of apply_hux_f_model / apply_forward_upwind_model,
+    v'_j = v_j + (v_{j+1} - v_j) / v_j * c_j with c_j = omega_rot * dr / dp_j and v'_np = v'_0, so
+        d v'_j / d v_j = 1 - c_j * v_{j+1} / v_j ** 2,   d v'_j / d v_{j+1} = c_j / v_j.
+    The output slices are the ones closest to r_out on the grid r0 + cumsum(dr_vec), the selection
+    itself is not differentiated (r0 only enters through the acceleration).
+
+    :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param r_out: list of output radii. units = (km).
+    :param grad_out: array (len(r_out) x r_initial.shape), gradient of the function with respect to the slices.
+    :param r0: float, initial radial location. units = (km).
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param omega_rot: differential rotation.
+    :return: v_out (len(r_out) x r_initial.shape), dict of gradients with keys
+             "r_initial" (r_initial.shape), "alpha", "rh", "r0" and "omega_rot" (floats).
+    """
+    slices, idx_out = _forward(r_initial, dr_vec, dp_vec, r_out, r0, alpha, rh, add_v_acc, omega_rot)
+    grads = _reverse(slices, idx_out, r_initial, dr_vec, dp_vec, grad_out, r0, alpha, rh, add_v_acc, omega_rot)
+    return np.array([slices[i] for i in idx_out]), grads
+
+
+def hux_f_misfit(r_initial, dr_vec, dp_vec, r_out, observed, r0=30 * 695700, alpha=0.15, rh=50 * 695700,
+                 add_v_acc=True, omega_rot=(2 * np.pi) / (25.38 * 86400), weights=None):
+    """Least squares misfit of HUX-f against observations and its gradient, see hux_f_vjp.
+
+    J = 0.5 * sum(weights * (v(r_out) - observed) ** 2), nan observations are ignored.
+
+    :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param r_out: list of radii of the observations. units = (km).
+    :param observed: array (len(r_out) x r_initial.shape), observed velocity. units = (km/sec).
+    :param r0: float, initial radial location. units = (km).
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param omega_rot: differential rotation.
+    :param weights: array broadcastable to observed, default = 1.
+    :return: J (float), dict of gradients (see hux_f_vjp).
+    """
+    observed = np.asarray(observed, dtype=float)
+    weights = np.where(np.isfinite(observed), 1. if weights is None else weights, 0.)
+    observed = np.nan_to_num(observed)
+
+    # dJ / dv_out = weights * (v_out - observed).
+    slices, idx_out = _forward(r_initial, dr_vec, dp_vec, r_out, r0, alpha, rh, add_v_acc, omega_rot)
+    v_out = np.array([slices[i] for i in idx_out])
+    residual = weights * (v_out - observed)
+    grads = _reverse(slices, idx_out, r_initial, dr_vec, dp_vec, residual, r0, alpha, rh, add_v_acc, omega_rot)
+    return 0.5 * np.sum(residual * (v_out - observed)), grads
+
+
+def _forward(r_initial, dr_vec, dp_vec, r_out, r0, alpha, rh, add_v_acc, omega_rot):
+    """ HUX-f run keeping every slice up to the last output radius, and the slice index of each output radius."""
+    dr_vec = np.asarray(dr_vec, dtype=float)
+    idx_out = np.argmin(np.abs(np.subtract.outer(np.atleast_1d(r_out), _radial_grid(r0, dr_vec))), axis=1)
+
+    v = np.asarray(r_initial, dtype=float)
+    if add_v_acc:
+        v_acc = alpha * (v * (1 - np.exp(-r0 / rh)))
+        v = v_acc + v
+    slices = [v]
+    for i in range(np.max(idx_out)):
+        v = _hux_f_step(v, (omega_rot * dr_vec[i]) / dp_vec)
+        slices.append(v)
+    return slices, idx_out
+
+
+def _reverse(slices, idx_out, r_initial, dr_vec, dp_vec, grad_out, r0, alpha, rh, add_v_acc, omega_rot):
+    """ reverse pass of the upwind recursion, see hux_f_vjp."""
+    r_initial = np.asarray(r_initial, dtype=float)
+    dp_vec = np.asarray(dp_vec, dtype=float)
+    grad_out = np.broadcast_to(grad_out, (len(idx_out),) + r_initial.shape)
+    n = len(dp_vec)
+
+    # lam is the gradient with respect to the slice at radius i.
+    lam = np.zeros(r_initial.shape)
+    grad_omega = 0.
+    for i in range(np.max(idx_out), -1, -1):
+        lam = lam + np.sum(grad_out[idx_out == i], axis=0)
+        if i == 0:
+            break
+
+        v = slices[i - 1]
+        c = (omega_rot * dr_vec[i - 1]) / dp_vec
+        # v'_np = v'_0, fold the periodic column back into the first one.
+        lam_next = lam[..., :n].copy()
+        lam_next[..., 0] += lam[..., n]
+
+        v_j, v_p = v[..., :n], v[..., 1:]
+        lam = np.zeros(r_initial.shape)
+        lam[..., :n] = lam_next * (1 - c * v_p / v_j ** 2)
+        lam[..., 1:] += lam_next * c / v_j
+        # d v'_j / d omega_rot = (v_{j+1} - v_j) / v_j * dr / dp_j.
+        grad_omega += np.sum(lam_next * (v_p - v_j) / v_j * (dr_vec[i - 1] / dp_vec))
+
+    grads = {"r_initial": lam, "alpha": 0., "rh": 0., "r0": 0., "omega_rot": grad_omega}
+    if add_v_acc:
+        # v0 = r_initial * (1 + alpha * (1 - exp(-r0 / rh))).
+        acc_factor = 1 - np.exp(-r0 / rh)
+        grads["r_initial"] = lam * (1 + alpha * acc_factor)
+        grads["alpha"] = np.sum(lam * r_initial * acc_factor)
+        d_acc = np.sum(lam * r_initial * alpha) * np.exp(-r0 / rh)
+        grads["rh"] = -d_acc * r0 / rh ** 2
+        grads["r0"] = d_acc / rh
+    return grads
@@ -1,10 +1,9 @@
 """HUX-f and HUX-b propagation implemented. """
 import numpy as np
-import copy
 
 
 def apply_hux_f_model(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
-                      omega_rot=(2 * np.pi) / (25.38 * 86400)):
+                      omega_rot=(2 * np.pi) / (25.38 * 86400), backend="numpy", r_out=None):
     """Apply 1d upwind model to the inviscid burgers equation.
     r/phi grid. return and save all radial velocity slices.
 
@@ -16,8 +15,18 @@ def apply_hux_f_model(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=
     :param r0: float, initial radial location. units = (km).
     :param add_v_acc: bool, True will add acceleration boost.
     :param omega_rot: differential rotation.
-    :return: velocity matrix dimensions (nr x np)
+    :param backend: "numpy" updates the whole phi row at once, "python" loops over each longitude cell.
+    :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+    :return: velocity matrix dimensions (nr x np), or (len(r_out) x np).
     """
+    if backend == "numpy":
+        return collect_radial_slices(iter_hux_f_model(r_initial, dr_vec, dp_vec, r0=r0, alpha=alpha, rh=rh,
+                                                      add_v_acc=add_v_acc, omega_rot=omega_rot),
+                                     r_vec=_radial_grid(r0, dr_vec), r_out=r_out)
+
+    elif backend != "python":
+        raise ValueError("Unknown backend: " + str(backend))
+
     v = np.zeros((len(dr_vec) + 1, len(dp_vec) + 1))  # initialize array vr.
     v[0, :] = r_initial
 
@@ -40,11 +49,11 @@ def apply_hux_f_model(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=
                 frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
                 v[i + 1, j] = v[i, j] + frac1 * frac2
 
-    return v
+    return collect_radial_slices(v, r_vec=_radial_grid(r0, dr_vec), r_out=r_out)
 
 
 def apply_hux_b_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v_acc=True,
-                      r0=30 * 695700, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+                      r0=30 * 695700, omega_rot=(2 * np.pi) / (25.38 * 86400), backend="numpy", r_out=None):
     """ Apply 1d backwards propagation.
 
     :param r_final: 1d array, initial velocity for backward propagation. units = (km/sec).
@@ -55,7 +64,19 @@ def apply_hux_b_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v
     :param add_v_acc: bool, True will add acceleration boost.
     :param r0: float, initial radial location. units = (km).
     :param omega_rot: differential rotation.
-    :return: velocity matrix dimensions (nr x np) """
+    :param backend: "numpy" updates the whole phi row at once, "python" loops over each longitude cell.
+    :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+    :return: velocity matrix dimensions (nr x np), or (len(r_out) x np). """
+
+    if backend == "numpy":
+        v = collect_radial_slices(iter_hux_b_model(r_final, dr_vec, dp_vec, alpha=alpha, rh=rh, add_v_acc=add_v_acc,
+                                                   r0=r0, omega_rot=omega_rot),
+                                  r_vec=_radial_grid(r0, dr_vec)[::-1], r_out=r_out)
+        # slices are yielded from the outer boundary inwards.
+        return v[::-1] if r_out is None else v
+
+    elif backend != "python":
+        raise ValueError("Unknown backend: " + str(backend))
 
     v = np.zeros((len(dr_vec) + 1, len(dp_vec) + 1))  # initialize array vr.
     v[-1, :] = r_final
@@ -81,11 +102,134 @@ def apply_hux_b_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v
         v_acc = alpha * (v[0, :] * (1 - np.exp(-r0 / rh)))
         v[0, :] = -v_acc + v[0, :]
 
+    return collect_radial_slices(v, r_vec=_radial_grid(r0, dr_vec), r_out=r_out)
+
+
+def apply_hux_f_model_3d(vr_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                         omega_rot=(2 * np.pi) / (25.38 * 86400), r_out=None):
+    """Apply HUX-f to all theta slices at once, every latitude is advanced
+    together as one 2d array operation per radial step.
+
+    :param vr_initial: 2d array (nphi x ntheta), inner boundary condition (vr0). units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+    :param r0: float, initial radial location. units = (km).
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param omega_rot: differential rotation.
+    :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+    :return: velocity cube dimensions (nr x ntheta x np), or (len(r_out) x ntheta x np).
+    """
+    return apply_hux_f_model(np.transpose(vr_initial), dr_vec, dp_vec, r0=r0, alpha=alpha, rh=rh,
+                             add_v_acc=add_v_acc, omega_rot=omega_rot, r_out=r_out)
+
+
+def apply_hux_b_model_3d(vr_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                         r0=30 * 695700, omega_rot=(2 * np.pi) / (25.38 * 86400), r_out=None):
+    """Apply HUX-b to all theta slices at once, every latitude is advanced
+    together as one 2d array operation per radial step.
+
+    :param vr_final: 2d array (nphi x ntheta), initial velocity for backward propagation. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r.
+    :param dp_vec: 1d array, mesh spacing in p.
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh:  float, hyper parameter for acceleration (default r=50 rs). units: (km)
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param r0: float, initial radial location. units = (km).
+    :param omega_rot: differential rotation.
+    :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+    :return: velocity cube dimensions (nr x ntheta x np), or (len(r_out) x ntheta x np). """
+    return apply_hux_b_model(np.transpose(vr_final), dr_vec, dp_vec, alpha=alpha, rh=rh, add_v_acc=add_v_acc,
+                             r0=r0, omega_rot=omega_rot, r_out=r_out)
+
+
+def iter_hux_f_model(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                     omega_rot=(2 * np.pi) / (25.38 * 86400)):
+    """Generator version of apply_hux_f_model, yields each radial velocity slice
+    as soon as it is computed so only the current slice is held in memory.
+
+    :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+    :param r0: float, initial radial location. units = (km).
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param omega_rot: differential rotation.
+    :return: generator of len(dr_vec) + 1 velocity slices, from r0 outwards.
+    """
+    v = np.array(r_initial, dtype=float)
+
+    if add_v_acc:
+        v_acc = alpha * (v * (1 - np.exp(-r0 / rh)))
+        v = v_acc + v
+
+    for i in range(len(dr_vec)):
+        yield v
+        _print_cfl(v, i, dr_vec, dp_vec, omega_rot)
+        v = _hux_f_step(v, (omega_rot * dr_vec[i]) / dp_vec)
+
+    yield v
+
+
+def iter_hux_b_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                     r0=30 * 695700, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+    """Generator version of apply_hux_b_model, yields each radial velocity slice
+    as soon as it is computed so only the current slice is held in memory.
+
+    :param r_final: array, initial velocity for backward propagation, phi along the last axis. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r.
+    :param dp_vec: 1d array, mesh spacing in p.
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh:  float, hyper parameter for acceleration (default r=50 rs). units: (km)
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param r0: float, initial radial location. units = (km).
+    :param omega_rot: differential rotation.
+    :return: generator of len(dr_vec) + 1 velocity slices, from the outer boundary inwards. """
+    v = np.array(r_final, dtype=float)
+
+    for i in range(len(dr_vec)):
+        yield v
+        _check_cfl(v, dr_vec[i], dp_vec, omega_rot)
+        v = _hux_b_step(v, (omega_rot * dr_vec[i]) / _periodic_dp(dp_vec))
+
+    # add acceleration after upwind.
+    if add_v_acc:
+        v_acc = alpha * (v * (1 - np.exp(-r0 / rh)))
+        v = -v_acc + v
+
+    yield v
+
+
+def collect_radial_slices(slices, r_vec, r_out=None):
+    """Gather radial velocity slices (from an iter_* generator) into a matrix.
+
+    :param slices: iterable of velocity slices.
+    :param r_vec: 1d array, radial location of each slice, in the order they are yielded. units = (km).
+    :param r_out: list of output radii. units = (km). each one keeps the closest slice (default None = all).
+    :return: velocity matrix dimensions (len(r_vec) x np), or (len(r_out) x np).
+    """
+    if r_out is None:
+        idx_out = np.arange(len(r_vec))
+    else:
+        idx_out = np.argmin(np.abs(np.subtract.outer(np.atleast_1d(r_out), r_vec)), axis=1)
+
+    idx_last = np.max(idx_out)
+    v = None
+    for idx, v_slice in enumerate(slices):
+        if v is None:
+            v = np.zeros((len(idx_out),) + np.shape(v_slice))
+        v[idx_out == idx] = v_slice
+
+        # stop marching once the last requested slice is computed.
+        if idx == idx_last:
+            break
     return v
 
 
 def apply_forward_upwind_model(r_initial, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v_acc=True, r0=30 * 695700,
-                               omega_rot=(2 * np.pi) / (25.38 * 86400)):
+                               omega_rot=(2 * np.pi) / (25.38 * 86400), backend="numpy", adaptive=False):
     """ Apply 1d forward upwind model. r/phi grid.
 
     :param r_initial: 1d array, initial condition (vr0). units = (km/sec).
@@ -96,6 +240,9 @@ def apply_forward_upwind_model(r_initial, dr_vec, dp_vec, alpha=0.15, rh=50 * 69
     :param add_v_acc: bool, True will add acceleration boost.
     :param r0: float, initial radial location. units = (km).
     :param omega_rot: differential rotation.
+    :param backend: "numpy" updates the whole phi row at once, "python" loops over each longitude cell.
+    :param adaptive: bool, True splits each radial step into the fewest sub-steps that satisfy the courant
+                     condition instead of raising ValueError (numpy backend only).
     :return: vr at r end.
     """
     v_next = np.zeros(len(dp_vec) + 1)  # initialize v_next.
@@ -106,31 +253,48 @@ def apply_forward_upwind_model(r_initial, dr_vec, dp_vec, alpha=0.15, rh=50 * 69
         v_acc = alpha * (v_prev * (1 - np.exp(-r0 / rh)))
         v_prev = v_acc + v_prev
 
-    for i in range(len(dr_vec)):
-        for j in range(len(dp_vec) + 1):
+    if backend == "numpy":
+        for i in range(len(dr_vec)):
+            if adaptive:
+                v_next = _adaptive_step(v_prev, dr_vec[i], dp_vec, omega_rot, _hux_f_step, dp_vec)
+            else:
+                _check_cfl(v_prev, dr_vec[i], dp_vec, omega_rot)
+                v_next = _hux_f_step(v_prev, (omega_rot * dr_vec[i]) / dp_vec)
+            v_prev = v_next
 
-            if j == len(dp_vec):  # force periodicity
-                v_next[-1] = v_next[0]
+    elif adaptive:
+        raise ValueError("Adaptive sub-stepping requires the numpy backend.")
 
-            else:
-                # courant condition
-                if (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]) > 1:
-                    print("CFL violated", dr_vec[i] - dp_vec[j] * v_prev[j] / omega_rot)
-                    raise ValueError('CFL violated')
+    elif backend == "python":
+        for i in range(len(dr_vec)):
+            for j in range(len(dp_vec) + 1):
 
-                frac1 = (v_prev[j + 1] - v_prev[j]) / v_prev[j]
-                frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
-                v_next[j] = v_prev[j] + frac1 * frac2
+                if j == len(dp_vec):  # force periodicity
+                    v_next[-1] = v_next[0]
 
-        # update v_prev to be the current v. np.copy- deep copy so when we modify
-        # v_next v_prev does not change.
-        v_prev = np.copy(v_next)
+                else:
+                    # courant condition
+                    if (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]) > 1:
+                        print("CFL violated", dr_vec[i] - dp_vec[j] * v_prev[j] / omega_rot)
+                        raise ValueError('CFL violated')
+
+                    frac1 = (v_prev[j + 1] - v_prev[j]) / v_prev[j]
+                    frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
+                    v_next[j] = v_prev[j] + frac1 * frac2
+
+            # update v_prev to be the current v. np.copy- deep copy so when we modify
+            # v_next v_prev does not change.
+            v_prev = np.copy(v_next)
+
+    else:
+        raise ValueError("Unknown backend: " + str(backend))
 
     return v_next
 
 
 def apply_backwards_upwind_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 695700, add_v_acc=True,
-                                 r0=30 * 695700, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+                                 r0=30 * 695700, omega_rot=(2 * np.pi) / (25.38 * 86400), backend="numpy",
+                                 adaptive=False):
     """ Apply 1d backwards upwind model to the inviscid burgers equation. r/phi grid.
 
     :param r_final: 1d array, initial velocity for backward propagation. units = (km/sec).
@@ -141,30 +305,49 @@ def apply_backwards_upwind_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 69
     :param add_v_acc: bool, True will add acceleration boost.
     :param r0: float, initial radial location. units = (km).
     :param omega_rot: differential rotation.
+    :param backend: "numpy" updates the whole phi row at once, "python" loops over each longitude cell.
+    :param adaptive: bool, True splits each radial step into the fewest sub-steps that satisfy the courant
+                     condition instead of raising ValueError (numpy backend only).
     :return: vr at r0. """
 
     v_next = np.zeros(len(dp_vec) + 1)  # initialize v_next.
     v_prev = r_final  # v_previous, r = 1 AU.
 
-    for i in range(len(dr_vec)):
-        for j in range(len(dp_vec) + 1):
+    if backend == "numpy":
+        for i in range(len(dr_vec)):
+            if adaptive:
+                v_next = _adaptive_step(v_prev, dr_vec[i], dp_vec, omega_rot, _hux_b_step, _periodic_dp(dp_vec))
+            else:
+                _check_cfl(v_prev, dr_vec[i], dp_vec, omega_rot)
+                v_next = _hux_b_step(v_prev, (omega_rot * dr_vec[i]) / _periodic_dp(dp_vec))
+            v_prev = v_next
 
-            if j != len(dp_vec):
-                # courant condition
-                if (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]) > 1:
-                    print("CFL violated", dr_vec[i] - dp_vec[j] * v_prev[j] / omega_rot)
-                    raise ValueError('CFL violated')
+    elif adaptive:
+        raise ValueError("Adaptive sub-stepping requires the numpy backend.")
 
-                frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
-            else:
-                frac2 = (omega_rot * dr_vec[i]) / dp_vec[0]
+    elif backend == "python":
+        for i in range(len(dr_vec)):
+            for j in range(len(dp_vec) + 1):
 
-            frac1 = (v_prev[j - 1] - v_prev[j]) / v_prev[j]
-            v_next[j] = v_prev[j] + frac1 * frac2
+                if j != len(dp_vec):
+                    # courant condition
+                    if (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]) > 1:
+                        print("CFL violated", dr_vec[i] - dp_vec[j] * v_prev[j] / omega_rot)
+                        raise ValueError('CFL violated')
+
+                    frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
+                else:
+                    frac2 = (omega_rot * dr_vec[i]) / dp_vec[0]
+
+                frac1 = (v_prev[j - 1] - v_prev[j]) / v_prev[j]
+                v_next[j] = v_prev[j] + frac1 * frac2
 
-        # update v_prev to be the current v. np.copy- deep copy so when we modify
-        # v_next v_prev does not change.
-        v_prev = np.copy(v_next)
+            # update v_prev to be the current v. np.copy- deep copy so when we modify
+            # v_next v_prev does not change.
+            v_prev = np.copy(v_next)
+
+    else:
+        raise ValueError("Unknown backend: " + str(backend))
 
     # add acceleration after upwind.
     if add_v_acc:
@@ -174,6 +357,336 @@ def apply_backwards_upwind_model(r_final, dr_vec, dp_vec, alpha=0.15, rh=50 * 69
     return v_next
 
 
+class HUXPlan:
+    """Precomputed HUX-f/HUX-b coefficients on a fixed r/phi grid.
+
+    Repeated runs on the same grid (ensemble studies, sweeps over initial conditions)
+    only pass the boundary velocity, the (omega_rot * dr) / dp tables, the acceleration
+    factor and the courant condition limits are computed once.
+    Results match apply_hux_f_model and apply_hux_b_model.
+    """
+
+    def __init__(self, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                 omega_rot=(2 * np.pi) / (25.38 * 86400)):
+        """
+        :param dr_vec: 1d array, mesh spacing in r. units = (km)
+        :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+        :param r0: float, initial radial location. units = (km).
+        :param alpha: float, hyper parameter for acceleration (default = 0.15).
+        :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+        :param add_v_acc: bool, True will add acceleration boost.
+        :param omega_rot: differential rotation.
+        """
+        self.dr_vec = np.asarray(dr_vec)
+        self.dp_vec = np.asarray(dp_vec)
+        self.r0 = r0
+        self.alpha = alpha
+        self.add_v_acc = add_v_acc
+        self.omega_rot = omega_rot
+
+        # radial location of every slice. units = (km).
+        self.r_vec = _radial_grid(r0, self.dr_vec)
+        # (omega_rot * dr) / dp for every radial step (rows) and longitude cell (columns).
+        self.frac2_f = (omega_rot * self.dr_vec[:, None]) / self.dp_vec
+        self.frac2_b = (omega_rot * self.dr_vec[:, None]) / _periodic_dp(self.dp_vec)
+        # the acceleration boost is v_acc = alpha * v * acc_factor.
+        self.acc_factor = 1 - np.exp(-r0 / rh)
+        # the courant condition holds while dr <= dp * v / omega_rot.
+        self.dp_omega = self.dp_vec / omega_rot
+
+    def max_stable_dr(self, v):
+        """ largest radial step satisfying the courant condition for the velocity slice v. units = (km)."""
+        return np.min(self.dp_omega * v[..., :len(self.dp_vec)])
+
+    def iter_forward(self, r_initial):
+        """Generator version of forward, yields each radial velocity slice from r0 outwards.
+
+        :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+        :return: generator of len(dr_vec) + 1 velocity slices.
+        """
+        v = np.array(r_initial, dtype=float)
+
+        if self.add_v_acc:
+            v_acc = self.alpha * (v * self.acc_factor)
+            v = v_acc + v
+
+        for i in range(len(self.dr_vec)):
+            yield v
+            if self.dr_vec[i] > self.max_stable_dr(v):
+                _print_cfl(v, i, self.dr_vec, self.dp_vec, self.omega_rot)
+            v = _hux_f_step(v, self.frac2_f[i])
+
+        yield v
+
+    def iter_backward(self, r_final):
+        """Generator version of backward, yields each radial velocity slice from the outer boundary inwards.
+
+        :param r_final: array, initial velocity for backward propagation, phi along the last axis. units = (km/sec).
+        :return: generator of len(dr_vec) + 1 velocity slices.
+        """
+        v = np.array(r_final, dtype=float)
+
+        for i in range(len(self.dr_vec)):
+            yield v
+            if self.dr_vec[i] > self.max_stable_dr(v):
+                _check_cfl(v, self.dr_vec[i], self.dp_vec, self.omega_rot)
+            v = _hux_b_step(v, self.frac2_b[i])
+
+        # add acceleration after upwind.
+        if self.add_v_acc:
+            v_acc = self.alpha * (v * self.acc_factor)
+            v = -v_acc + v
+
+        yield v
+
+    def forward(self, r_initial, r_out=None):
+        """Apply HUX-f, same as apply_hux_f_model on the plan grid.
+
+        :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+        :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+        :return: velocity matrix dimensions (nr x np), or (len(r_out) x np).
+        """
+        return collect_radial_slices(self.iter_forward(r_initial), r_vec=self.r_vec, r_out=r_out)
+
+    def backward(self, r_final, r_out=None):
+        """Apply HUX-b, same as apply_hux_b_model on the plan grid.
+
+        :param r_final: array, initial velocity for backward propagation, phi along the last axis. units = (km/sec).
+        :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+        :return: velocity matrix dimensions (nr x np), or (len(r_out) x np).
+        """
+        v = collect_radial_slices(self.iter_backward(r_final), r_vec=self.r_vec[::-1], r_out=r_out)
+        # slices are yielded from the outer boundary inwards.
+        return v[::-1] if r_out is None else v
+
+
+# TimeDependentHUX recomputes the whole row once the window of affected longitudes covers this fraction of it.
+FULL_ROW_FRACTION = 0.8
+
+
+class TimeDependentHUX:
+    """HUX-f over a time series of inner boundary maps (e.g. consecutive Carrington maps) on a fixed grid.
+
+    The previous solution is kept and each new map only recomputes the cells downstream of the longitudes
+    whose boundary changed. Cell (i + 1, j) depends on cells (i, j) and (i, j + 1), so the changed
+    longitudes spread by one cell per radial step. With atol = 0 every solution matches apply_hux_f_model.
+    """
+
+    def __init__(self, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                 omega_rot=(2 * np.pi) / (25.38 * 86400), atol=0.):
+        """
+        :param dr_vec: 1d array, mesh spacing in r. units = (km)
+        :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+        :param r0: float, initial radial location. units = (km).
+        :param alpha: float, hyper parameter for acceleration (default = 0.15).
+        :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+        :param add_v_acc: bool, True will add acceleration boost.
+        :param omega_rot: differential rotation.
+        :param atol: float, boundary changes up to atol are ignored (default = 0, exact). units = (km/sec).
+        """
+        self.plan = HUXPlan(dr_vec, dp_vec, r0=r0, alpha=alpha, rh=rh, add_v_acc=add_v_acc, omega_rot=omega_rot)
+        self.atol = atol
+        self.boundary = None
+        self.v = None
+        # number of cells recomputed by the last update.
+        self.recomputed = 0
+
+    def update(self, r_initial):
+        """Propagate a new inner boundary map.
+
+        :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+        :return: velocity matrix dimensions (nr x np), updated in place by the next update (copy it to keep it).
+        """
+        r_initial = np.array(r_initial, dtype=float)
+        if self.v is None or r_initial.shape != self.boundary.shape:
+            self.boundary = r_initial
+            self.v = self.plan.forward(r_initial)
+            self.recomputed = self.v.size
+            return self.v
+
+        plan = self.plan
+        n = len(plan.dp_vec)
+        changed = np.abs(r_initial - self.boundary) > self.atol
+        # the last column repeats the first one.
+        changed[..., 0] |= changed[..., n]
+        changed[..., n] = changed[..., 0]
+
+        # periodic window [start, start + length) of the changed longitudes (of any latitude).
+        window = _periodic_window(np.any(np.reshape(changed[..., :n], (-1, n)), axis=0))
+        if window is None:
+            self.recomputed = 0
+            return self.v
+        start, length = window
+
+        v = self.v
+        v0 = r_initial
+        if plan.add_v_acc:
+            v_acc = plan.alpha * (v0 * plan.acc_factor)
+            v0 = v_acc + v0
+        v[0] = np.where(changed, v0, v[0])
+        # only the changed longitudes are kept as the new boundary, so small changes (<= atol) can not add up.
+        self.boundary = np.where(changed, r_initial, self.boundary)
+        self.recomputed = np.count_nonzero(changed)
+
+        for i in range(len(plan.dr_vec)):
+            # cell (i + 1, j) depends on (i, j) and (i, j + 1), the window grows by one cell towards phi = 0.
+            start, length = (start - 1) % n, length + 1
+            if length >= FULL_ROW_FRACTION * n:
+                # the window covers most of the row, update the remaining rows at once.
+                start, length = 0, n
+            self.recomputed += length * (v[i].size // (n + 1))
+            _hux_f_window_step(v[i], v[i + 1], plan.frac2_f[i], start, length)
+        return v
+
+
+def iter_hux_f_time_dependent(maps, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                              omega_rot=(2 * np.pi) / (25.38 * 86400), r_out=None, atol=0.):
+    """Apply HUX-f to a time series of inner boundary maps, each map reuses the solution of the previous one
+    (see TimeDependentHUX).
+
+    :param maps: iterable of (time, r_initial) pairs, ex: zip(times, maps) or a dict.items().
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param r0: float, initial radial location. units = (km).
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param omega_rot: differential rotation.
+    :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+    :param atol: float, boundary changes up to atol are ignored (default = 0, exact). units = (km/sec).
+    :return: generator of (time, velocity matrix (nr x np) or (len(r_out) x np)), independent arrays.
+    """
+    model = TimeDependentHUX(dr_vec, dp_vec, r0=r0, alpha=alpha, rh=rh, add_v_acc=add_v_acc, omega_rot=omega_rot,
+                             atol=atol)
+    if r_out is not None:
+        idx_out = np.argmin(np.abs(np.subtract.outer(np.atleast_1d(r_out), model.plan.r_vec)), axis=1)
+
+    for time, r_initial in maps:
+        v = model.update(r_initial)
+        # the model updates v in place, every yielded matrix is a copy.
+        yield time, (v.copy() if r_out is None else v[idx_out])
+
+
+def _hux_f_step(v_prev, frac2):
+    """One forward upwind step applied to the whole phi row (last axis) at once.
+
+    :param v_prev: velocity at the current radius, the last column repeats the first. units = (km/sec).
+    :param frac2: omega_rot * dr / dp_vec, one value per longitude cell.
+    :return: velocity at the next radius.
+    """
+    v_next = np.empty(np.shape(v_prev))
+    frac1 = (v_prev[..., 1:] - v_prev[..., :-1]) / v_prev[..., :-1]
+    v_next[..., :-1] = v_prev[..., :-1] + frac1 * frac2
+    # force periodicity
+    v_next[..., -1] = v_next[..., 0]
+    return v_next
+
+
+def _hux_f_window_step(v_prev, v_next, frac2, start, length):
+    """_hux_f_step of the longitude cells [start, start + length) (periodic) only, v_next is updated in place.
+
+    :param v_prev: velocity at the current radius, the last column repeats the first. units = (km/sec).
+    :param v_next: velocity at the next radius, updated in place. units = (km/sec).
+    :param frac2: omega_rot * dr / dp_vec, one value per longitude cell.
+    :param start: first cell of the window.
+    :param length: number of cells of the window.
+    """
+    n = len(frac2)
+    # the window wraps around phi = 2pi into two contiguous slices.
+    for a, b in ((start, min(start + length, n)), (0, start + length - n)):
+        if b > a:
+            frac1 = (v_prev[..., a + 1:b + 1] - v_prev[..., a:b]) / v_prev[..., a:b]
+            v_next[..., a:b] = v_prev[..., a:b] + frac1 * frac2[a:b]
+    # force periodicity
+    v_next[..., n] = v_next[..., 0]
+
+
+def _periodic_window(mask):
+    """ return (start, length) of the shortest periodic window containing every True cell of mask, None if
+    there is none."""
+    idx = np.flatnonzero(mask)
+    if len(idx) == 0:
+        return None
+    # the window is the complement of the largest gap between consecutive cells.
+    gaps = np.diff(np.append(idx, idx[0] + len(mask)))
+    k = np.argmax(gaps)
+    start = idx[(k + 1) % len(idx)]
+    return int(start), int(len(mask) - gaps[k] + 1)
+
+
+def _hux_b_step(v_prev, frac2):
+    """One backwards upwind step applied to the whole phi row (last axis) at once.
+
+    :param v_prev: velocity at the current radius. units = (km/sec).
+    :param frac2: omega_rot * dr / dp, one value per longitude cell (see _periodic_dp).
+    :return: velocity at the next radius (towards the sun).
+    """
+    # periodic neighbour j - 1, for j = 0 this is the last cell.
+    frac1 = (np.roll(v_prev, 1, axis=-1) - v_prev) / v_prev
+    return v_prev + frac1 * frac2
+
+
+def _periodic_dp(dp_vec):
+    """ mesh spacing in p for every cell of the backwards scheme, the last cell reuses dp_vec[0]."""
+    return np.append(dp_vec, dp_vec[0])
+
+
+def _print_cfl(v, i, dr_vec, dp_vec, omega_rot):
+    """Print every cell of the phi row where the courant condition is violated (HUX-f does not stop)."""
+    for idx in np.argwhere((omega_rot * dr_vec[i]) / (dp_vec * v[..., :len(dp_vec)]) > 1):
+        j = idx[-1]
+        print(dr_vec[i] - dp_vec[j] * v[tuple(idx)] / omega_rot)
+        print(i, j)  # courant condition
+
+
+def _radial_grid(r0, dr_vec):
+    """ radial location of every slice, starting at r0. units = (km)."""
+    return r0 + np.concatenate(([0], np.cumsum(dr_vec)))
+
+
+def _stable_substep(remaining, dp_vec, v, omega_rot):
+    """Largest radial step, at most remaining, satisfying the courant condition dr <= dp * v / omega_rot.
+
+    :param remaining: float, radial distance left in the current step. units = (km).
+    :param dp_vec: mesh spacing in p of the cells that are propagated. units = (radians)
+    :param v: velocity of the cells that are propagated. units = (km/sec).
+    :param omega_rot: differential rotation.
+    :return: radial sub-step. units = (km).
+    """
+    dr_max = np.min(dp_vec * v / omega_rot, initial=np.inf)
+    if not dr_max > 0:
+        raise ValueError('CFL violated, the velocity must be positive.')
+    return remaining if remaining <= dr_max else dr_max
+
+
+def _adaptive_step(v, dr, dp_vec, omega_rot, step, dp_cells):
+    """Advance v by the radial step dr using the fewest sub-steps that satisfy the courant condition.
+
+    :param v: velocity at the current radius. units = (km/sec).
+    :param dr: float, radial step. units = (km).
+    :param dp_vec: 1d array, mesh spacing in p.
+    :param omega_rot: differential rotation.
+    :param step: _hux_f_step or _hux_b_step.
+    :param dp_cells: mesh spacing in p for every cell updated by step (dp_vec or _periodic_dp(dp_vec)).
+    :return: velocity at the next radius.
+    """
+    remaining = dr
+    while remaining > 0:
+        sub_dr = _stable_substep(remaining, dp_vec, v[..., :len(dp_vec)], omega_rot)
+        v = step(v, (omega_rot * sub_dr) / dp_cells)
+        remaining = remaining - sub_dr
+    return v
+
+
+def _check_cfl(v, dr, dp_vec, omega_rot):
+    """Raise ValueError if the courant condition is violated anywhere on the phi row."""
+    violated = (omega_rot * dr) / (dp_vec * v[..., :len(dp_vec)]) > 1
+    if np.any(violated):
+        idx = tuple(np.argwhere(violated)[0])
+        print("CFL violated", dr - dp_vec[idx[-1]] * v[idx] / omega_rot)
+        raise ValueError('CFL violated')
+
+
 def apply_ballistic_approximation(v_initial, dr, phi_vec, omega_rot=(2 * np.pi) / (25.38 * 86400)):
     """ Apply the ballistic model for mapping solar wind streams to
     different locations in the heliosphere is the simplest possible approximation
@@ -207,85 +720,122 @@ def apply_modified_ballistic_approximation(v_initial, r0_vec, rf_vec, phi_vec, o
     # force periodicity
     return phi_shifted % (2 * np.pi)
 
-def forward_radial_boosting(r_vec, v_vec, p_vec, nr=30, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+def forward_radial_boosting(r_vec, v_vec, p_vec, nr=30, omega_rot=(2 * np.pi) / (25.38 * 86400), adaptive=False,
+                            r_grid=None):
     """Radial boost if the initial condition r0 is non uniform.
     Requirements: r_vec is single-valued function of longitude.
 
     :param omega_rot: differential rotation.
-    :param nr: radial grid number of points.
+    :param adaptive: bool, True sub-steps each radial step to satisfy the courant condition instead of raising ValueError.
+    :param nr: radial grid number of points (ignored if r_grid is given).
     :param r_vec: spacecraft radial trajectory, type = 1d numpy array. units: km.
     :param v_vec: velocity (vr), type = 1d numpy array. units: km/sec.
     :param p_vec: spacecraft longitude trajectory, type = 1d numpy array. units: radians.
+    :param r_grid: increasing radial grid, type = 1d numpy array. units: km.
+                   default = nr uniform points between the min and max of r_vec.
     :return: v_vec modified with radial boost.
     """
-    # max and min of radial trajectory.
-    r_max = np.max(r_vec)
-    r_min = np.min(r_vec)
-    # create a uniform grid of radial spacing.
-    r_grid = np.linspace(r_min, r_max, nr)
+    r_grid = _boosting_grid(r_vec, nr, r_grid)
     dr_vec = r_grid[1:] - r_grid[:-1]
     dp_vec = p_vec[1:] - p_vec[:-1]
-
-    # deep copy the initial velocity vector before modifying.
-    v_mod = copy.deepcopy(v_vec)
+    v_mod = np.array(v_vec, dtype=float)
 
     for ii in range(len(dr_vec)):
-        for jj in range(len(dp_vec) + 1):
-            if r_vec[jj] < r_grid[ii]:
-                # modify and propagate towards the upwind direction.
-                if jj == len(dp_vec):  # force periodicity
-                    v_mod[-1] = v_mod[0]
-
-                else:
-                    # courant condition
-                    if (omega_rot * dr_vec[ii]) / (dp_vec[jj] * v_mod[jj]) > 1:
-                        print("CFL violated", dr_vec[ii] - dp_vec[jj] * v_mod[jj] / omega_rot)
-                        raise ValueError('CFL violated')
-
-                    frac1 = (v_mod[jj + 1] - v_mod[jj]) / v_mod[jj]
-                    frac2 = (omega_rot * dr_vec[ii]) / dp_vec[jj]
-                    v_mod[jj] = v_mod[jj] + frac1 * frac2
+        # longitude cells that are propagated at this radial step.
+        active = np.asarray(r_vec) < r_grid[ii]
+        cells = active[:len(dp_vec)]
+        remaining = dr_vec[ii]
+
+        while remaining > 0:
+            dr = _stable_substep(remaining, dp_vec[cells], v_mod[:len(dp_vec)][cells], omega_rot) if adaptive \
+                else remaining
+            remaining = remaining - dr
+
+            # courant condition, always satisfied by the adaptive sub-steps.
+            if not adaptive:
+                _check_cfl(v_mod[:len(dp_vec)][cells], dr, dp_vec[cells], omega_rot)
+
+            # modify and propagate towards the upwind direction, only the active cells.
+            v_mod[:-1] = np.where(cells, _hux_f_step(v_mod, (omega_rot * dr) / dp_vec)[:-1], v_mod[:-1])
+            # force periodicity
+            if active[-1]:
+                v_mod[-1] = v_mod[0]
     return v_mod
 
 
-def backwards_radial_boosting(r_vec, v_vec, p_vec, nr=30, omega_rot=(2 * np.pi) / (25.38 * 86400)):
+def backwards_radial_boosting(r_vec, v_vec, p_vec, nr=30, omega_rot=(2 * np.pi) / (25.38 * 86400), adaptive=False,
+                              r_grid=None, sequential=True):
     """Radial boost if the destintination spacecraft radial trajectory is non uniform.
     Requirements: r_vec is single-valued function of longitude.
 
     :param omega_rot: differential rotation.
-    :param nr: radial grid number of points.
+    :param adaptive: bool, True sub-steps each radial step to satisfy the courant condition instead of raising ValueError.
+    :param nr: radial grid number of points (ignored if r_grid is given).
     :param r_vec: spacecraft radial trajectory, type = 1d numpy array. units: km.
     :param v_vec: velocity (vr), type = 1d numpy array. units: km/sec.
     :param p_vec: spacecraft longitude trajectory, type = 1d numpy array. units: radians.
+    :param r_grid: increasing radial grid, type = 1d numpy array. units: km.
+                   default = nr uniform points between the min and max of r_vec.
+    :param sequential: bool, True (default) sweeps the cells in order of longitude, each cell sees the already
+                       updated velocity of the previous one (the original scheme). False updates every cell
+                       from the velocities of the previous step, like apply_hux_b_model, in one vectorized step.
     :return: v_vec modified with radial boost.
     """
-    # max and min of radial trajectory.
-    r_max = np.max(r_vec)
-    r_min = np.min(r_vec)
-
-    # create a uniform grid of radial spacing.
-    r_grid = np.linspace(r_min, r_max, nr)
+    r_grid = _boosting_grid(r_vec, nr, r_grid)
     dr_vec = r_grid[1:] - r_grid[:-1]
     dp_vec = p_vec[1:] - p_vec[:-1]
-
-    # deep copy the initial velocity vector before modifying.
-    v_mod = copy.deepcopy(v_vec)
+    v_mod = np.array(v_vec, dtype=float)
 
     for ii in range(len(dr_vec)):
-        for jj in range(len(dp_vec) + 1):
-            if r_vec[jj] < r_grid[ii]:
-                # modify and propagate towards the downwind direction.
-                if jj != len(dp_vec):
-                    # courant condition
-                    if (omega_rot * dr_vec[ii]) / (dp_vec[jj] * v_mod[jj]) > 1:
-                        print("CFL violated", dr_vec[ii] - dp_vec[jj] * v_mod[jj] / omega_rot)
-                        raise ValueError('CFL violated')
-                    frac2 = (omega_rot * dr_vec[ii]) / dp_vec[jj]
-                else:
-                    frac2 = (omega_rot * dr_vec[ii]) / dp_vec[0]
-
-                frac1 = (v_mod[jj - 1] - v_mod[jj]) / v_mod[jj]
-                v_mod[jj] = v_mod[jj] + frac1 * frac2
+        # longitude cells that are propagated at this radial step.
+        active = np.asarray(r_vec) < r_grid[ii]
+        cells = active[:len(dp_vec)]
+        remaining = dr_vec[ii]
+
+        while remaining > 0:
+            dr = _stable_substep(remaining, dp_vec[cells], v_mod[:len(dp_vec)][cells], omega_rot) if adaptive \
+                else remaining
+            remaining = remaining - dr
+
+            # courant condition, always satisfied by the adaptive sub-steps.
+            if not adaptive:
+                _check_cfl(v_mod[:len(dp_vec)][cells], dr, dp_vec[cells], omega_rot)
+
+            # modify and propagate towards the downwind direction, only the active cells.
+            frac2 = (omega_rot * dr) / _periodic_dp(dp_vec)
+            if sequential:
+                v_mod = _hux_b_sweep(v_mod, frac2, np.flatnonzero(active))
+            else:
+                v_mod = np.where(active, _hux_b_step(v_mod, frac2), v_mod)
 
     return v_mod
 
+
+def _hux_b_sweep(v_prev, frac2, cells):
+    """One backwards upwind step of the cells in order, each cell is updated from the new value of cell j - 1.
+    The sweep is a recurrence, it runs on python floats (same double precision arithmetic as numpy).
+
+    :param v_prev: 1d array, velocity at the current radius. units = (km/sec).
+    :param frac2: omega_rot * dr / dp, one value per longitude cell (see _periodic_dp).
+    :param cells: increasing indices of the cells that are propagated.
+    :return: velocity at the next radius (towards the sun).
+    """
+    v = v_prev.tolist()
+    frac2 = frac2.tolist()
+    for jj in cells.tolist():
+        # periodic neighbour j - 1, for j = 0 this is the last cell.
+        frac1 = (v[jj - 1] - v[jj]) / v[jj]
+        v[jj] = v[jj] + frac1 * frac2[jj]
+    return np.array(v)
+
+
+def _boosting_grid(r_vec, nr=30, r_grid=None):
+    """ return the radial grid of the radial boosting, the user grid or nr points spanning r_vec. units: km."""
+    if r_grid is None:
+        # create a uniform grid of radial spacing between the min and max of radial trajectory.
+        return np.linspace(np.min(r_vec), np.max(r_vec), nr)
+
+    r_grid = np.asarray(r_grid, dtype=float)
+    if r_grid.ndim != 1 or np.any(np.diff(r_grid) <= 0):
+        raise ValueError("r_grid must be a strictly increasing 1d array.")
+    return r_grid
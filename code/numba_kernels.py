@@ -0,0 +1,189 @@
+""" Numba compiled radial marches for the numerical methods, one kernel per scheme/limiter pair. """
+
+import functools
+import math
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+@functools.lru_cache(maxsize=None)
+def compiles(limiter):
+    """ return True if numba is installed and can compile the flux-limiter for float64 values of theta."""
+    if numba is None:
+        return False
+    try:
+        numba.njit("float64(float64)", error_model="numpy")(limiter)
+    except (TypeError, numba.core.errors.NumbaError):
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def forward_march(numerical_method, limiter):
+    """Compile the radial march of one forward numerical method and flux-limiter.
+
+    march(v, dr_vec, dp_vec, omega_rot, i0, out) marches v (nbatch x np) len(out) radial steps starting at
+    step i0, out[s] (nbatch x np) is the slice after step i0 + s. The logarithm of each cell is computed once
+    per step and the cells violating the courant condition are not updated (left at 0).
+
+    :param numerical_method: specify the numerical method used (str).
+    :param limiter: flux-limiter function of theta.
+    :return: compiled march, returns the number of cells violating the courant condition at each step.
+    """
+    cell = _forward_cell(numerical_method, numba.njit(limiter))
+
+    @numba.njit(error_model="numpy")
+    def march(v, dr_vec, dp_vec, omega_rot, i0, out):
+        n = v.shape[1] - 1
+        log_v = np.empty(n + 1)
+        violations = np.zeros(out.shape[0], dtype=np.int64)
+        for s in range(out.shape[0]):
+            dr = dr_vec[i0 + s]
+            v_prev = v if s == 0 else out[s - 1]
+            for b in range(v.shape[0]):
+                for j in range(n + 1):
+                    log_v[j] = math.log(v_prev[b, j])
+                for j in range(n):
+                    # courant condition
+                    if (omega_rot * dr) / (dp_vec[j] * v_prev[b, j]) > 1:
+                        out[s, b, j] = 0.
+                        violations[s] += 1
+                    else:
+                        # j - 1 wraps around to the last cell for j = 0.
+                        out[s, b, j] = cell(v_prev[b, j - 1], v_prev[b, j], v_prev[b, j + 1], log_v[j - 1],
+                                            log_v[j], log_v[j + 1], (omega_rot * dr) / dp_vec[j], dr / dp_vec[j],
+                                            omega_rot)
+                # force periodicity
+                out[s, b, n] = out[s, b, 0]
+        return violations
+
+    return march
+
+
+@functools.lru_cache(maxsize=None)
+def backward_march(limiter):
+    """Compile the backwards upwind/lax-wendroff radial march of one flux-limiter.
+
+    march(v, dr_vec, dp_vec, omega_rot, i0, out) marches v (nbatch x np) len(out) radial steps starting at
+    step i0, out[s] (nbatch x np) is the slice after step i0 + s. The march stops before the first step
+    violating the courant condition.
+
+    :param limiter: flux-limiter function of theta.
+    :return: compiled march, returns the number of steps done.
+    """
+    limiter = numba.njit(limiter)
+
+    @numba.njit(error_model="numpy")
+    def march(v, dr_vec, dp_vec, omega_rot, i0, out):
+        n = v.shape[1] - 1
+        log_v = np.empty(n + 1)
+        for s in range(out.shape[0]):
+            dr = dr_vec[i0 + s]
+            v_prev = v if s == 0 else out[s - 1]
+            for b in range(v.shape[0]):
+                for j in range(n):
+                    if (omega_rot * dr) / (dp_vec[j] * v_prev[b, j]) > 1:
+                        return s
+
+            for b in range(v.shape[0]):
+                for j in range(n + 1):
+                    log_v[j] = math.log(v_prev[b, j])
+                for j in range(n + 1):
+                    # the periodic point uses the mesh spacing of the first cell.
+                    frac2 = (omega_rot * dr) / dp_vec[j if j < n else 0]
+                    v_j, v_m, l0, lm = v_prev[b, j], v_prev[b, j - 1], log_v[j], log_v[j - 1]
+                    v_p, lp = (v_prev[b, j + 1], log_v[j + 1]) if j < n else (v_prev[b, 0], log_v[0])
+
+                    # quasi-linear upwind scheme
+                    sol_first_order = v_j + ((v_m - v_j) / v_j) * frac2
+
+                    # Lax Wendroff's method
+                    v_half_plus = 0.5 * (v_p + v_j + frac2 * (l0 - lp))
+                    v_half_minus = 0.5 * (v_m + v_j + frac2 * (lm - l0))
+                    higher_order_sol = v_j + frac2 * (math.log(v_half_minus) - math.log(v_half_plus))
+
+                    # evaluate the smoothness of the current wave.
+                    if j == n or v_p == v_j:
+                        theta = 0.
+                    else:
+                        theta = (v_j - v_m) / (v_p - v_j)
+
+                    out[s, b, j] = sol_first_order + limiter(theta) * (higher_order_sol - sol_first_order)
+        return out.shape[0]
+
+    return march
+
+
+def _forward_cell(numerical_method, limiter):
+    """ return the compiled single cell update of a forward numerical method, lm, l0, l1 = log(v_m), log(v), log(v_p)."""
+    if numerical_method == "maccormack":
+        @numba.njit(error_model="numpy")
+        def cell(v_m, v, v_p, lm, l0, l1, nu, dr_dp, omega_rot):
+            v_star_curr = v + nu * (l1 - l0)
+            v_star_prev = v_m + nu * (l0 - lm)
+            return 0.5 * (v + v_star_curr) + (nu / 2) * (math.log(v_star_curr) - math.log(v_star_prev))
+
+    elif numerical_method == "lax_wendroff":
+        @numba.njit(error_model="numpy")
+        def cell(v_m, v, v_p, lm, l0, l1, nu, dr_dp, omega_rot):
+            # v(j + 1/2) and v(j - 1/2)
+            v_star_curr = 0.5 * (v_p + v) + (nu / 2) * (l1 - l0)
+            v_star_prev = 0.5 * (v + v_m) + (nu / 2) * (l0 - lm)
+            return v + nu * (math.log(v_star_curr) - math.log(v_star_prev))
+
+    elif numerical_method == "lax_friedrichs":
+        @numba.njit(error_model="numpy")
+        def cell(v_m, v, v_p, lm, l0, l1, nu, dr_dp, omega_rot):
+            return 0.5 * (v_m + v_p) + (nu / 2) * (l1 - lm)
+
+    elif numerical_method == "upwind_first_maccormack":
+        @numba.njit(error_model="numpy")
+        def cell(v_m, v, v_p, lm, l0, l1, nu, dr_dp, omega_rot):
+            # first order upwind method (conservative)
+            f_lower_curr = -omega_rot * l1
+            f_lower_prev = -omega_rot * l0
+
+            # McCormack's method
+            v_star_curr = v + nu * (l1 - l0)
+            v_star_prev = v_m + nu * (l0 - lm)
+            f_upper_curr = 0.5 * (f_lower_curr - omega_rot * math.log(v_star_curr))
+            f_upper_prev = 0.5 * (f_lower_prev - omega_rot * math.log(v_star_prev))
+
+            # evaluate the smoothness of the current wave.
+            theta = 0. if v_p == v else (v - v_m) / (v_p - v)
+            phi = limiter(theta)
+
+            final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
+            final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
+            return v - dr_dp * (final_flux_curr - final_flux_prev)
+
+    elif numerical_method == "upwind_first_lax_wendroff":
+        @numba.njit(error_model="numpy")
+        def cell(v_m, v, v_p, lm, l0, l1, nu, dr_dp, omega_rot):
+            # first order upwind method (conservative)
+            f_lower_curr = -omega_rot * l1
+            f_lower_prev = -omega_rot * l0
+
+            # Lax-Wendroff method
+            v_star_curr = 0.5 * (v_p + v) + (nu / 2) * (l1 - l0)
+            v_star_prev = 0.5 * (v + v_m) + (nu / 2) * (l0 - lm)
+            f_upper_curr = -omega_rot * math.log(v_star_curr)
+            f_upper_prev = -omega_rot * math.log(v_star_prev)
+
+            # evaluate the smoothness of the current wave.
+            theta = 0. if v_p == v else (v - v_m) / (v_p - v)
+            phi = limiter(theta)
+
+            final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
+            final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
+            return v - dr_dp * (final_flux_curr - final_flux_prev)
+
+    else:
+        raise ValueError("Unknown numerical method: " + str(numerical_method))
+
+    return cell
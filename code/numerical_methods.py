@@ -1,11 +1,14 @@
 """ Numerical methods other than the 1st order upwind scheme. """
 
 import numpy as np
+from code.hux_propagation import collect_radial_slices
+from code import numba_kernels
+from code.flux_limiters import get_limiter, smoothness_ratio
 
 
 def apply_numerical_method(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
                            omega_rot=(2 * np.pi) / (25.38 * 86400), numerical_method="upwind_first_maccormack",
-                           flux_function="vanleer", direction="f"):
+                           flux_function="vanleer", direction="f", r_out=None, backend="numpy"):
     """Apply a numerical method to solve the solar wind problem.
     r/phi grid. return and save all radial velocity slices.
 
@@ -18,166 +21,393 @@ def apply_numerical_method(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15
     :param add_v_acc: bool, True will add acceleration boost.
     :param omega_rot: differential rotation.
     :param numerical_method: specify the numerical method used (str).
-    :param flux_function: a flux-limiter function for high-low res solutions.
+    :param flux_function: a flux-limiter function for high-low res solutions, name in LIMITERS or a function.
     :param direction: "f" or "b" direction of marching the solution.
-    :return: velocity matrix dimensions (nr x np)
+    :param r_out: list of output radii. units = (km). only the slices closest to r_out are kept (default None = all).
+    :param backend: "numpy" vectorized rows (default), "numba" compiled radial march, "python" loop over each cell,
+                    "auto" uses numba if it is installed and compiles the flux-limiter, numpy otherwise.
+    :return: velocity matrix dimensions (nr x np), or (len(r_out) x np).
     """
-    v = np.zeros((len(dr_vec) + 1, len(dp_vec) + 1))  # initialize array vr.
+    # radial location of each slice, in the order they are computed.
+    r_vec = r0 + np.concatenate(([0], np.cumsum(dr_vec)))
+    if direction == "b":
+        r_vec = r_vec[::-1]
 
-    if direction == "f":
-        v[0, :] = r_initial
+    return collect_radial_slices(iter_numerical_method(r_initial, dr_vec, dp_vec, r0=r0, alpha=alpha, rh=rh,
+                                                       add_v_acc=add_v_acc, omega_rot=omega_rot,
+                                                       numerical_method=numerical_method,
+                                                       flux_function=flux_function, direction=direction,
+                                                       backend=backend),
+                                 r_vec=r_vec, r_out=r_out)
 
-        if add_v_acc:
-            v_acc = alpha * (v[0, :] * (1 - np.exp(-r0 / rh)))
-            v[0, :] = v_acc + v[0, :]
 
-        for i in range(len(dr_vec)):
-            for j in range(len(dp_vec) + 1):
+# numerical methods available for marching the solution forward.
+FORWARD_METHODS = ("maccormack", "lax_wendroff", "lax_friedrichs", "upwind_first_maccormack",
+                   "upwind_first_lax_wendroff")
 
-                if j == len(dp_vec):  # force periodicity
-                    v[i + 1, j] = v[i + 1, 0]
+# number of cells (radial steps x nbatch x np) marched per call of the compiled numba march.
+NUMBA_CHUNK_CELLS = 2 ** 20
 
-                else:
-                    if (omega_rot * dr_vec[i]) / (dp_vec[j] * v[i, j]) > 1:
-                        print(dr_vec[i] - dp_vec[j] * v[i, j] / omega_rot)
-                        print(i, j)  # courant condition
-
-                    elif numerical_method == "maccormack":
-                        nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
-                        v_star_curr = v[i, j] + nu * (np.log(v[i, j + 1]) - np.log(v[i, j]))
-                        v_star_prev = v[i, j - 1] + nu * (np.log(v[i, j]) - np.log(v[i, j - 1]))
-                        v[i + 1, j] = 0.5 * (v[i, j] + v_star_curr) + (nu / 2) * (
-                                np.log(v_star_curr) - np.log(v_star_prev))
-
-                    elif numerical_method == "lax_wendroff":
-                        # coefficient
-                        nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
-                        # v(j + 1/2)
-                        v_star_curr = 0.5 * (v[i, j + 1] + v[i, j]) + (nu / 2) * (np.log(v[i, j + 1]) - np.log(v[i, j]))
-                        # v(j - 1/2)
-                        v_star_prev = 0.5 * (v[i, j] + v[i, j - 1]) + (nu / 2) * (np.log(v[i, j]) - np.log(v[i, j - 1]))
-                        v[i + 1, j] = v[i, j] + nu * (np.log(v_star_curr) - np.log(v_star_prev))
-
-                    elif numerical_method == "lax_friedrichs":
-                        nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
-                        v[i + 1, j] = 0.5 * (v[i, j - 1] + v[i, j + 1]) + \
-                                      (nu / 2) * (np.log(v[i, j + 1]) - np.log(v[i, j - 1]))
-
-                    elif numerical_method == "upwind_first_maccormack":
-                        # first order upwind method (conservative)
-                        f_lower_curr = -omega_rot * np.log(v[i, j + 1])
-                        f_lower_prev = -omega_rot * np.log(v[i, j])
-
-                        # McCormack's method
-                        nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
-                        v_star_curr = v[i, j] + nu * (np.log(v[i, j + 1]) - np.log(v[i, j]))
-                        v_star_prev = v[i, j - 1] + nu * (np.log(v[i, j]) - np.log(v[i, j - 1]))
-
-                        f_upper_curr = 0.5 * (f_lower_curr - omega_rot * np.log(v_star_curr))
-                        f_upper_prev = 0.5 * (f_lower_prev - omega_rot * np.log(v_star_prev))
-
-                        # evaluate the smoothness of the current wave.
-                        if v[i, j + 1] == v[i, j]:
-                            theta = 0
-                        else:
-                            theta = (v[i, j] - v[i, j - 1]) / (v[i, j + 1] - v[i, j])
-
-                        # limiter function
-                        phi = limiter_function(theta=theta, limiter=flux_function)
-
-                        final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
-                        final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
-
-                        v[i + 1, j] = v[i, j] - (dr_vec[i] / dp_vec[j]) * (final_flux_curr - final_flux_prev)
-
-                    elif numerical_method == "upwind_first_lax_wendroff":
-                        # first order upwind method (conservative)
-                        f_lower_curr = -omega_rot * np.log(v[i, j + 1])
-                        f_lower_prev = -omega_rot * np.log(v[i, j])
-
-                        # Lax-Wendroff method
-                        nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
-                        # v(j + 1/2)
-                        v_star_curr = 0.5 * (v[i, j + 1] + v[i, j]) + (nu / 2) * (np.log(v[i, j + 1]) - np.log(v[i, j]))
-                        # v(j - 1/2)
-                        v_star_prev = 0.5 * (v[i, j] + v[i, j - 1]) + (nu / 2) * (np.log(v[i, j]) - np.log(v[i, j - 1]))
-                        f_upper_curr = -omega_rot * np.log(v_star_curr)
-                        f_upper_prev = -omega_rot * np.log(v_star_prev)
-
-                        # evaluate the smoothness of the current wave.
-                        if v[i, j + 1] == v[i, j]:
-                            theta = 0
-                        else:
-                            theta = (v[i, j] - v[i, j - 1]) / (v[i, j + 1] - v[i, j])
-
-                        # limiter function "superbee"
-                        phi = limiter_function(theta=theta, limiter=flux_function)
-
-                        final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
-                        final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
-
-                        v[i + 1, j] = v[i, j] - (dr_vec[i] / dp_vec[j]) * (final_flux_curr - final_flux_prev)
 
-    elif direction == "b" and numerical_method == "upwind_first_lax_wendroff":
-        v[0, :] = r_initial
+def iter_numerical_method(r_initial, dr_vec, dp_vec, r0=30 * 695700, alpha=0.15, rh=50 * 695700, add_v_acc=True,
+                          omega_rot=(2 * np.pi) / (25.38 * 86400), numerical_method="upwind_first_maccormack",
+                          flux_function="vanleer", direction="f", backend="numpy"):
+    """Generator version of apply_numerical_method, yields each radial velocity slice
+    as soon as it is computed so only the current slice is held in memory.
 
+    :param r_initial: 1d array, initial condition (vr0). units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param alpha: float, hyper parameter for acceleration (default = 0.15).
+    :param rh: float, hyper parameter for acceleration (default r=50*695700). units: (km)
+    :param r0: float, initial radial location. units = (km).
+    :param add_v_acc: bool, True will add acceleration boost.
+    :param omega_rot: differential rotation.
+    :param numerical_method: specify the numerical method used (str).
+    :param flux_function: a flux-limiter function for high-low res solutions, name in LIMITERS or a function.
+    :param direction: "f" or "b" direction of marching the solution.
+    :param backend: "numpy" vectorized rows (default), "numba" compiled radial march, "python" loop over each cell,
+                    "auto" uses numba if it is installed and compiles the flux-limiter, numpy otherwise.
+    :return: generator of len(dr_vec) + 1 velocity slices, in marching order.
+    """
+    if backend == "auto":
+        backend = "numba" if numba_kernels.compiles(get_limiter(flux_function)) else "numpy"
+    elif backend == "numba" and numba_kernels.numba is None:
+        raise ImportError("The numba backend requires numba to be installed.")
+    elif backend not in ("numpy", "python", "numba"):
+        raise ValueError("Unknown backend: " + str(backend))
+
+    v = np.array(r_initial, dtype=float)
+
+    if direction == "f" and numerical_method in FORWARD_METHODS:
+        if add_v_acc:
+            v_acc = alpha * (v * (1 - np.exp(-r0 / rh)))
+            v = v_acc + v
+
+        steps = _forward_steps(v, dr_vec, dp_vec, omega_rot, numerical_method, flux_function, backend)
         for i in range(len(dr_vec)):
-            for j in range(len(dp_vec) + 1):
-                if j != len(dp_vec):
-                    # courant condition
-                    if (omega_rot * dr_vec[i]) / (dp_vec[j] * v[i, j]) > 1:
-                        print("CFL violated", (omega_rot * dr_vec[i]) / (dp_vec[j] * v[i, j]))
-                        print("i = ", i)
-                        raise ValueError('CFL violated')
-
-                    frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
-                else:
-                    frac2 = (omega_rot * dr_vec[i]) / dp_vec[0]
+            yield v
+            v = next(steps)
+        yield v
+
+    elif direction == "b" and numerical_method == "upwind_first_lax_wendroff":
+        steps = _backward_steps(v, dr_vec, dp_vec, omega_rot, flux_function, backend)
+        for i in range(len(dr_vec)):
+            yield v
+            v = next(steps)
 
-                # quasi-linear upwind scheme
-                frac1 = (v[i, j - 1] - v[i, j]) / v[i, j]
-                sol_first_order = v[i, j] + frac1 * frac2
+        if add_v_acc:
+            v_acc = alpha * (v * (1 - np.exp(-r0 / rh)))
+            v = -v_acc + v
+        yield v
+
+    else:
+        raise ValueError("Unsupported numerical method and direction: " + str(numerical_method) + ", "
+                         + str(direction))
+
+
+def _forward_step(v_prev, i, dr_vec, dp_vec, omega_rot, numerical_method, flux_function):
+    """ march the solution one radial step outwards, return the next velocity slice."""
+    v_next = np.zeros(len(dp_vec) + 1)
+
+    for j in range(len(dp_vec) + 1):
+
+        if j == len(dp_vec):  # force periodicity
+            v_next[j] = v_next[0]
+
+        else:
+            if (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]) > 1:
+                print(dr_vec[i] - dp_vec[j] * v_prev[j] / omega_rot)
+                print(i, j)  # courant condition
+
+            elif numerical_method == "maccormack":
+                nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
+                v_star_curr = v_prev[j] + nu * (np.log(v_prev[j + 1]) - np.log(v_prev[j]))
+                v_star_prev = v_prev[j - 1] + nu * (np.log(v_prev[j]) - np.log(v_prev[j - 1]))
+                v_next[j] = 0.5 * (v_prev[j] + v_star_curr) + (nu / 2) * (
+                        np.log(v_star_curr) - np.log(v_star_prev))
+
+            elif numerical_method == "lax_wendroff":
+                # coefficient
+                nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
+                # v(j + 1/2)
+                v_star_curr = 0.5 * (v_prev[j + 1] + v_prev[j]) + (nu / 2) * (np.log(v_prev[j + 1]) - np.log(v_prev[j]))
+                # v(j - 1/2)
+                v_star_prev = 0.5 * (v_prev[j] + v_prev[j - 1]) + (nu / 2) * (np.log(v_prev[j]) - np.log(v_prev[j - 1]))
+                v_next[j] = v_prev[j] + nu * (np.log(v_star_curr) - np.log(v_star_prev))
+
+            elif numerical_method == "lax_friedrichs":
+                nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
+                v_next[j] = 0.5 * (v_prev[j - 1] + v_prev[j + 1]) + \
+                            (nu / 2) * (np.log(v_prev[j + 1]) - np.log(v_prev[j - 1]))
+
+            elif numerical_method == "upwind_first_maccormack":
+                # first order upwind method (conservative)
+                f_lower_curr = -omega_rot * np.log(v_prev[j + 1])
+                f_lower_prev = -omega_rot * np.log(v_prev[j])
+
+                # McCormack's method
+                nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
+                v_star_curr = v_prev[j] + nu * (np.log(v_prev[j + 1]) - np.log(v_prev[j]))
+                v_star_prev = v_prev[j - 1] + nu * (np.log(v_prev[j]) - np.log(v_prev[j - 1]))
+
+                f_upper_curr = 0.5 * (f_lower_curr - omega_rot * np.log(v_star_curr))
+                f_upper_prev = 0.5 * (f_lower_prev - omega_rot * np.log(v_star_prev))
 
-                # Lax Wendroff's method
-                if j == len(dp_vec):
-                    v_half_plus = 0.5 * (v[i, 0] + v[i, j] + frac2 * (np.log(v[i, j]) - np.log(v[i, 0])))
+                # evaluate the smoothness of the current wave.
+                if v_prev[j + 1] == v_prev[j]:
+                    theta = 0
                 else:
-                    v_half_plus = 0.5 * (v[i, j + 1] + v[i, j] + frac2 * (np.log(v[i, j]) - np.log(v[i, j + 1])))
+                    theta = (v_prev[j] - v_prev[j - 1]) / (v_prev[j + 1] - v_prev[j])
+
+                # limiter function
+                phi = limiter_function(theta=theta, limiter=flux_function)
 
-                v_half_minus = 0.5 * (v[i, j - 1] + v[i, j] + frac2 * (np.log(v[i, j - 1]) - np.log(v[i, j])))
+                final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
+                final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
 
+                v_next[j] = v_prev[j] - (dr_vec[i] / dp_vec[j]) * (final_flux_curr - final_flux_prev)
 
-                higher_order_sol = v[i, j] + frac2 * (np.log(v_half_minus) - np.log(v_half_plus))
+            elif numerical_method == "upwind_first_lax_wendroff":
+                # first order upwind method (conservative)
+                f_lower_curr = -omega_rot * np.log(v_prev[j + 1])
+                f_lower_prev = -omega_rot * np.log(v_prev[j])
+
+                # Lax-Wendroff method
+                nu = (omega_rot * dr_vec[i]) / (dp_vec[j])
+                # v(j + 1/2)
+                v_star_curr = 0.5 * (v_prev[j + 1] + v_prev[j]) + (nu / 2) * (np.log(v_prev[j + 1]) - np.log(v_prev[j]))
+                # v(j - 1/2)
+                v_star_prev = 0.5 * (v_prev[j] + v_prev[j - 1]) + (nu / 2) * (np.log(v_prev[j]) - np.log(v_prev[j - 1]))
+                f_upper_curr = -omega_rot * np.log(v_star_curr)
+                f_upper_prev = -omega_rot * np.log(v_star_prev)
 
                 # evaluate the smoothness of the current wave.
-                if j == len(dp_vec):
-                    if v[i, -1] == v[i, j]:
-                        theta = 0
-                    else:
-                        theta = (v[i, j] - v[i, j - 1]) / (v[i, -1] - v[i, j])
-                elif v[i, j + 1] == v[i, j]:
+                if v_prev[j + 1] == v_prev[j]:
                     theta = 0
                 else:
-                    theta = (v[i, j] - v[i, j - 1]) / (v[i, j + 1] - v[i, j])
+                    theta = (v_prev[j] - v_prev[j - 1]) / (v_prev[j + 1] - v_prev[j])
 
-                # limiter function
+                # limiter function "superbee"
                 phi = limiter_function(theta=theta, limiter=flux_function)
 
-                v[i + 1, j] = sol_first_order + phi * (higher_order_sol - sol_first_order)
+                final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
+                final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
 
-        if add_v_acc:
-            v_acc = alpha * (v[-1, :] * (1 - np.exp(-r0 / rh)))
-            v[-1, :] = -v_acc + v[-1, :]
-    return v
+                v_next[j] = v_prev[j] - (dr_vec[i] / dp_vec[j]) * (final_flux_curr - final_flux_prev)
+
+    return v_next
+
+
+def _backward_step(v_prev, i, dr_vec, dp_vec, omega_rot, flux_function):
+    """ march the upwind/lax-wendroff solution one radial step inwards, return the next velocity slice."""
+    v_next = np.zeros(len(dp_vec) + 1)
+
+    for j in range(len(dp_vec) + 1):
+        if j != len(dp_vec):
+            # courant condition
+            if (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]) > 1:
+                print("CFL violated", (omega_rot * dr_vec[i]) / (dp_vec[j] * v_prev[j]))
+                print("i = ", i)
+                raise ValueError('CFL violated')
+
+            frac2 = (omega_rot * dr_vec[i]) / dp_vec[j]
+        else:
+            frac2 = (omega_rot * dr_vec[i]) / dp_vec[0]
+
+        # quasi-linear upwind scheme
+        frac1 = (v_prev[j - 1] - v_prev[j]) / v_prev[j]
+        sol_first_order = v_prev[j] + frac1 * frac2
+
+        # Lax Wendroff's method
+        if j == len(dp_vec):
+            v_half_plus = 0.5 * (v_prev[0] + v_prev[j] + frac2 * (np.log(v_prev[j]) - np.log(v_prev[0])))
+        else:
+            v_half_plus = 0.5 * (v_prev[j + 1] + v_prev[j] + frac2 * (np.log(v_prev[j]) - np.log(v_prev[j + 1])))
+
+        v_half_minus = 0.5 * (v_prev[j - 1] + v_prev[j] + frac2 * (np.log(v_prev[j - 1]) - np.log(v_prev[j])))
+
+        higher_order_sol = v_prev[j] + frac2 * (np.log(v_half_minus) - np.log(v_half_plus))
+
+        # evaluate the smoothness of the current wave.
+        if j == len(dp_vec):
+            if v_prev[-1] == v_prev[j]:
+                theta = 0
+            else:
+                theta = (v_prev[j] - v_prev[j - 1]) / (v_prev[-1] - v_prev[j])
+        elif v_prev[j + 1] == v_prev[j]:
+            theta = 0
+        else:
+            theta = (v_prev[j] - v_prev[j - 1]) / (v_prev[j + 1] - v_prev[j])
+
+        # limiter function
+        phi = limiter_function(theta=theta, limiter=flux_function)
+
+        v_next[j] = sol_first_order + phi * (higher_order_sol - sol_first_order)
+
+    return v_next
+
+
+def _forward_step_numpy(v_prev, i, dr_vec, dp_vec, omega_rot, numerical_method, flux_function):
+    """ vectorized _forward_step, the whole phi row (last axis) is updated at once."""
+    n = len(dp_vec)
+    ok = _forward_cfl(v_prev, i, dr_vec, dp_vec, omega_rot)
+    nu = (omega_rot * dr_vec[i]) / dp_vec
+
+    # cell j, its neighbours j + 1 and j - 1 (periodic) and their log.
+    v, v_p, v_m = v_prev[..., :n], v_prev[..., 1:], np.roll(v_prev, 1, axis=-1)[..., :n]
+    log_v = np.log(v_prev)
+    l0, l1, lm = log_v[..., :n], log_v[..., 1:], np.roll(log_v, 1, axis=-1)[..., :n]
+
+    if numerical_method in ("maccormack", "upwind_first_maccormack"):
+        v_star_curr = v + nu * (l1 - l0)
+        v_star_prev = v_m + nu * (l0 - lm)
+    elif numerical_method in ("lax_wendroff", "upwind_first_lax_wendroff"):
+        # v(j + 1/2) and v(j - 1/2)
+        v_star_curr = 0.5 * (v_p + v) + (nu / 2) * (l1 - l0)
+        v_star_prev = 0.5 * (v + v_m) + (nu / 2) * (l0 - lm)
+
+    if numerical_method == "maccormack":
+        v_new = 0.5 * (v + v_star_curr) + (nu / 2) * (np.log(v_star_curr) - np.log(v_star_prev))
+
+    elif numerical_method == "lax_wendroff":
+        v_new = v + nu * (np.log(v_star_curr) - np.log(v_star_prev))
+
+    elif numerical_method == "lax_friedrichs":
+        v_new = 0.5 * (v_m + v_p) + (nu / 2) * (l1 - lm)
+
+    else:
+        # first order upwind method (conservative)
+        f_lower_curr = -omega_rot * l1
+        f_lower_prev = -omega_rot * l0
+
+        if numerical_method == "upwind_first_maccormack":
+            f_upper_curr = 0.5 * (f_lower_curr - omega_rot * np.log(v_star_curr))
+            f_upper_prev = 0.5 * (f_lower_prev - omega_rot * np.log(v_star_prev))
+        else:
+            f_upper_curr = -omega_rot * np.log(v_star_curr)
+            f_upper_prev = -omega_rot * np.log(v_star_prev)
+
+        # evaluate the smoothness of the current wave.
+        phi = limiter_function(theta=smoothness_ratio(v_m, v, v_p), limiter=flux_function)
+
+        final_flux_curr = f_lower_curr + phi * (f_upper_curr - f_lower_curr)
+        final_flux_prev = f_lower_prev + phi * (f_upper_prev - f_lower_prev)
+        v_new = v - (dr_vec[i] / dp_vec) * (final_flux_curr - final_flux_prev)
+
+    v_next = np.zeros(np.shape(v_prev))
+    # cells violating the courant condition are not updated.
+    v_next[..., :n] = np.where(ok, v_new, 0.)
+    # force periodicity
+    v_next[..., -1] = v_next[..., 0]
+    return v_next
+
+
+def _backward_step_numpy(v_prev, i, dr_vec, dp_vec, omega_rot, flux_function):
+    """ vectorized _backward_step, the whole phi row (last axis) is updated at once."""
+    _backward_cfl(v_prev, i, dr_vec, dp_vec, omega_rot)
+    frac2 = (omega_rot * dr_vec[i]) / np.append(dp_vec, dp_vec[0])
+
+    # periodic neighbours j - 1 and j + 1.
+    v_m, v_p = np.roll(v_prev, 1, axis=-1), np.roll(v_prev, -1, axis=-1)
+    log_v, log_m, log_p = np.log(v_prev), np.log(v_m), np.log(v_p)
+
+    # quasi-linear upwind scheme
+    sol_first_order = v_prev + ((v_m - v_prev) / v_prev) * frac2
+
+    # Lax Wendroff's method
+    v_half_plus = 0.5 * (v_p + v_prev + frac2 * (log_v - log_p))
+    v_half_minus = 0.5 * (v_m + v_prev + frac2 * (log_m - log_v))
+    higher_order_sol = v_prev + frac2 * (np.log(v_half_minus) - np.log(v_half_plus))
+
+    # evaluate the smoothness of the current wave, theta = 0 at the last cell.
+    theta = smoothness_ratio(v_m, v_prev, v_p)
+    theta[..., -1] = 0.
+    phi = limiter_function(theta=theta, limiter=flux_function)
+
+    return sol_first_order + phi * (higher_order_sol - sol_first_order)
+
+
+def _forward_steps(v, dr_vec, dp_vec, omega_rot, numerical_method, flux_function, backend):
+    """ generator of the velocity slices after each radial step outwards."""
+    if backend == "numba":
+        yield from _forward_march_numba(v, dr_vec, dp_vec, omega_rot, numerical_method, flux_function)
+        return
+
+    forward_step = _forward_step_numpy if backend == "numpy" else _forward_step
+    for i in range(len(dr_vec)):
+        v = forward_step(v, i, dr_vec, dp_vec, omega_rot, numerical_method, flux_function)
+        yield v
+
+
+def _backward_steps(v, dr_vec, dp_vec, omega_rot, flux_function, backend):
+    """ generator of the velocity slices after each radial step inwards."""
+    if backend == "numba":
+        yield from _backward_march_numba(v, dr_vec, dp_vec, omega_rot, flux_function)
+        return
+
+    backward_step = _backward_step_numpy if backend == "numpy" else _backward_step
+    for i in range(len(dr_vec)):
+        v = backward_step(v, i, dr_vec, dp_vec, omega_rot, flux_function)
+        yield v
+
+
+def _forward_march_numba(v, dr_vec, dp_vec, omega_rot, numerical_method, flux_function):
+    """ _forward_steps with the compiled radial march of the numerical method and flux-limiter,
+    the steps are marched in chunks of about NUMBA_CHUNK_CELLS cells."""
+    march = numba_kernels.forward_march(numerical_method, get_limiter(flux_function))
+    dr_vec, dp_vec = np.asarray(dr_vec, dtype=float), np.asarray(dp_vec, dtype=float)
+    v_2d = np.ascontiguousarray(np.reshape(v, (-1, len(dp_vec) + 1)))
+    chunk_size = max(1, NUMBA_CHUNK_CELLS // v_2d.size)
+
+    for i0 in range(0, len(dr_vec), chunk_size):
+        out = np.empty((min(chunk_size, len(dr_vec) - i0),) + v_2d.shape)
+        violations = march(v_2d, dr_vec, dp_vec, omega_rot, i0, out)
+        for s in range(len(out)):
+            if violations[s]:
+                # print the cells violating the courant condition.
+                _forward_cfl(out[s - 1] if s else v_2d, i0 + s, dr_vec, dp_vec, omega_rot)
+            yield np.reshape(out[s], np.shape(v))
+        v_2d = out[-1]
+
+
+def _backward_march_numba(v, dr_vec, dp_vec, omega_rot, flux_function):
+    """ _backward_steps with the compiled radial march of the flux-limiter,
+    the steps are marched in chunks of about NUMBA_CHUNK_CELLS cells."""
+    march = numba_kernels.backward_march(get_limiter(flux_function))
+    dr_vec, dp_vec = np.asarray(dr_vec, dtype=float), np.asarray(dp_vec, dtype=float)
+    v_2d = np.ascontiguousarray(np.reshape(v, (-1, len(dp_vec) + 1)))
+    chunk_size = max(1, NUMBA_CHUNK_CELLS // v_2d.size)
+
+    for i0 in range(0, len(dr_vec), chunk_size):
+        out = np.empty((min(chunk_size, len(dr_vec) - i0),) + v_2d.shape)
+        done = march(v_2d, dr_vec, dp_vec, omega_rot, i0, out)
+        for s in range(done):
+            yield np.reshape(out[s], np.shape(v))
+        if done < len(out):
+            # the march stopped before a step violating the courant condition, raise ValueError.
+            _backward_cfl(out[done - 1] if done else v_2d, i0 + done, dr_vec, dp_vec, omega_rot)
+        v_2d = out[-1]
+
+
+def _forward_cfl(v_prev, i, dr_vec, dp_vec, omega_rot):
+    """ print the cells violating the courant condition, return a mask of the cells that can be updated."""
+    violated = (omega_rot * dr_vec[i]) / (dp_vec * v_prev[..., :len(dp_vec)]) > 1
+    for idx in np.argwhere(violated):
+        print(dr_vec[i] - dp_vec[idx[-1]] * v_prev[tuple(idx)] / omega_rot)
+        print(i, idx[-1])  # courant condition
+    return ~violated
+
+
+def _backward_cfl(v_prev, i, dr_vec, dp_vec, omega_rot):
+    """ raise ValueError if the courant condition is violated anywhere on the phi row."""
+    cfl = (omega_rot * dr_vec[i]) / (dp_vec * v_prev[..., :len(dp_vec)])
+    if np.any(cfl > 1):
+        print("CFL violated", cfl[cfl > 1][0])
+        print("i = ", i)
+        raise ValueError('CFL violated')
 
 
 def limiter_function(theta, limiter="minmod"):
-    """ return a flux-limiter-function result."""
-    if limiter == "vanleer":
-        return (np.abs(theta) + theta) / (1 + np.abs(theta))
-    elif limiter == "minmod":
-        return max(0., min(1., theta))
-    elif limiter == "superbee":
-        return max(0., min(1., 2 * theta), min(theta, 2))
-    elif limiter == "mc":
-        return max(0., min((1 + theta) / 2, 2, 2 * theta))
+    """ return a flux-limiter-function result, theta can be a float or an array (see code.flux_limiters)."""
+    return get_limiter(limiter)(theta)
@@ -0,0 +1,217 @@
+""" Compare HUX and MAS results to in situ observations (OMNI, Helios), the observer positions of a rotation are
+indexed once and every cube is sampled along them with one vectorized gather. """
+import os
+
+import numpy as np
+
+from code.carrington_dates import carrington_rotation_interval
+from code.trajectory_sampler import TrajectorySampler
+
+# (name, starttime, endtime, cadence, cache_dir) -> ObservationIndex.
+_INDEX_CACHE = {}
+
+
+class ObservationIndex:
+    """Position of an observer in the Carrington frame at a series of times.
+
+    ex: omni_index = ObservationIndex.from_rotation(1653, SpicePositions("Earth"), "earth").at(omni_data.index)
+        sampler = TrajectorySampler(p, t, r)
+        vr_sampled_mhd_omni = omni_index.sample(f, sampler)
+
+    :param times: 1d array of np.datetime64 (or datetime.datetime), increasing.
+    :param r: 1d array, radius. units = (km).
+    :param lat: 1d array, Carrington latitude. units = (radians).
+    :param lon: 1d array, Carrington longitude. units = (radians).
+    """
+
+    def __init__(self, times, r, lat, lon):
+        self.times = np.asarray(times, dtype="datetime64[ns]")
+        self.r, self.lat, self.lon = (np.asarray(x, dtype=float) for x in (r, lat, lon))
+        if not len(self.times) == len(self.r) == len(self.lat) == len(self.lon):
+            raise ValueError("times, r, lat and lon must have the same length.")
+        # sampler -> Location, see locate.
+        self._locations = {}
+
+    @classmethod
+    def from_interval(cls, name, starttime, endtime, positions, cadence=np.timedelta64(1, "h"), cache_dir=None):
+        """Index the positions of an observer between starttime and endtime at a fixed cadence, the index is
+        kept in memory and, if cache_dir is given, in cache_dir/<name>_<starttime>_<endtime>_<cadence>s.npz.
+
+        :param name: str, name of the observer, part of the cache key. ex: "earth"
+        :param starttime: datetime.datetime or np.datetime64.
+        :param endtime: datetime.datetime or np.datetime64.
+        :param positions: function(times) returning r (km), lat (radians), lon (radians), ex: SpicePositions.
+        :param cadence: np.timedelta64, time step of the index.
+        :param cache_dir: directory of the index files, default = None (memory only).
+        :return: ObservationIndex.
+        """
+        starttime, endtime = np.datetime64(starttime, "s"), np.datetime64(endtime, "s")
+        cadence = np.timedelta64(cadence)
+        key = (name, starttime, endtime, cadence, cache_dir)
+        if key in _INDEX_CACHE:
+            return _INDEX_CACHE[key]
+
+        path = None
+        if cache_dir is not None:
+            stamp = "_".join(str(t).replace(":", "") for t in (starttime, endtime))
+            seconds = str(int(cadence / np.timedelta64(1, "s")))
+            path = os.path.join(cache_dir, name + "_" + stamp + "_" + seconds + "s.npz")
+
+        if path is not None and os.path.exists(path):
+            with np.load(path) as f:
+                index = cls(f["times"], f["r"], f["lat"], f["lon"])
+        else:
+            times = np.arange(starttime, endtime + cadence, cadence).astype("datetime64[ns]")
+            index = cls(times, *positions(times))
+            if path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.savez(path, times=index.times, r=index.r, lat=index.lat, lon=index.lon)
+
+        _INDEX_CACHE[key] = index
+        return index
+
+    @classmethod
+    def from_rotation(cls, cr, positions, name, cadence=np.timedelta64(1, "h"), cache_dir=None):
+        """Index the positions of an observer over one Carrington rotation, see from_interval.
+
+        :param cr: Carrington rotation number (int).
+        :return: ObservationIndex.
+        """
+        starttime, endtime = carrington_rotation_interval(int(cr))
+        return cls.from_interval(name, starttime, endtime, positions, cadence=cadence, cache_dir=cache_dir)
+
+    def at(self, times):
+        """ return the ObservationIndex at other times (e.g. the observation times), interpolated linearly,
+        nan outside of the index."""
+        times = np.asarray(times, dtype="datetime64[ns]")
+        return ObservationIndex(times, *interpolate_positions(self.times, self.r, self.lat, self.lon, times))
+
+    def locate(self, sampler, r_unit=1.):
+        """Grid location of the observer on the grid of a TrajectorySampler, computed once per sampler.
+
+        :param sampler: TrajectorySampler of a (phi x theta x r) grid.
+        :param r_unit: float, radial unit of the grid. units = (km), ex: 695700 for solar radii.
+        :return: Location.
+        """
+        key = (id(sampler), r_unit)
+        if key not in self._locations:
+            self._locations[key] = (sampler, sampler.locate(self.lon, self.lat, self.r / r_unit))
+        return self._locations[key][1]
+
+    def sample(self, cube, sampler, r_unit=1., fill_value=np.nan):
+        """Sample one or more cubes along the observer positions.
+
+        :param cube: array (... x nphi x ntheta x nr) on the grid of sampler, leading axes are sampled together.
+        :param sampler: TrajectorySampler.
+        :param r_unit: float, radial unit of the grid, see locate.
+        :param fill_value: value of the positions outside of the grid.
+        :return: array (... x len(times)).
+        """
+        return sampler.sample(cube, location=self.locate(sampler, r_unit=r_unit), fill_value=fill_value)
+
+
+def interpolate_positions(t_grid, r, lat, lon, times):
+    """Linear interpolation of positions in time, the longitude is unwrapped so that crossing 0/2pi
+    interpolates across the cut.
+
+    :param t_grid: 1d array of np.datetime64, increasing.
+    :param r: 1d array, radius at t_grid.
+    :param lat: 1d array, latitude at t_grid. units = (radians).
+    :param lon: 1d array, longitude at t_grid. units = (radians).
+    :param times: array of np.datetime64.
+    :return: r, lat, lon at times, lon in [0, 2pi), nan outside of t_grid.
+    """
+    t_grid = np.asarray(t_grid, dtype="datetime64[ns]")
+    x = (t_grid - t_grid[0]) / np.timedelta64(1, "s")
+    xi = (np.asarray(times, dtype="datetime64[ns]") - t_grid[0]) / np.timedelta64(1, "s")
+    outside = (xi < x[0]) | (xi > x[-1]) | np.isnan(xi)
+
+    r_i = np.interp(xi, x, r)
+    lat_i = np.interp(xi, x, lat)
+    lon_i = np.mod(np.interp(xi, x, np.unwrap(lon)), 2 * np.pi)
+    return tuple(np.where(outside, np.nan, y) for y in (r_i, lat_i, lon_i))
+
+
+def compare_observations(models, observed):
+    """Root mean square error, mean absolute error and pearson correlation coefficient of model time series
+    against observations, points where the model or the observation is nan are ignored.
+
+    :param models: dict, name -> array (... x n), leading axes are scored together (e.g. ensemble members).
+    :param observed: 1d array (n), observed velocity. units = (km/sec).
+    :return: dict, "rmse_<name>", "mae_<name>", "cc_<name>" -> float or array (...).
+    """
+    observed = np.asarray(observed, dtype=float)
+    scores = {}
+    for name, v_model in models.items():
+        v_model = np.asarray(v_model, dtype=float)
+        mask = np.isfinite(v_model) & np.isfinite(observed)
+        n = np.sum(mask, axis=-1)
+        diff = np.where(mask, v_model - observed, 0)
+
+        model = np.where(mask, v_model, 0)
+        obs = np.where(mask, observed, 0)
+        model = np.where(mask, model - np.sum(model, axis=-1, keepdims=True) / np.expand_dims(n, -1), 0)
+        obs = np.where(mask, obs - np.sum(obs, axis=-1, keepdims=True) / np.expand_dims(n, -1), 0)
+
+        scores["rmse_" + name] = np.sqrt(np.sum(diff ** 2, axis=-1) / n)[()]
+        scores["mae_" + name] = (np.sum(np.abs(diff), axis=-1) / n)[()]
+        scores["cc_" + name] = (np.sum(model * obs, axis=-1) /
+                                np.sqrt(np.sum(model ** 2, axis=-1) * np.sum(obs ** 2, axis=-1)))[()]
+    return scores
+
+
+class SpicePositions:
+    """Positions of a body in the Carrington (IAU_SUN) frame from heliopy spice, needs the kernels.
+
+    :param body: spice body name. ex: "Earth", "Helios 1"
+    :param kernel: heliopy kernel to download first. ex: "helios1", default = None.
+    """
+
+    def __init__(self, body, kernel=None):
+        self.body = body
+        self.kernel = kernel
+
+    def __call__(self, times):
+        """ return r (km), lat (radians), lon (radians) at times."""
+        import heliopy.data.spice as spicedata
+        import heliopy.spice as spice
+
+        if self.kernel is not None:
+            spicedata.get_kernel(self.kernel)
+        traj = spice.Trajectory(self.body)
+        traj.generate_positions(times=list(np.asarray(times, dtype="datetime64[us]").astype(object)),
+                                observing_body='Sun', frame='IAU_SUN')
+        coords = traj.coords
+        return (coords.radius.to("km").value, coords.lat.to("rad").value, coords.lon.to("rad").value)
+
+
+class ObservationMetrics:
+    """observation_metrics of rotation_runner.process_rotation: score the MHD solution and HUX-f (outer boundary)
+    against an observer, picklable so it can run in the worker processes.
+
+    :param name: str, name of the observer, used in the metric names and the index cache. ex: "omni"
+    :param positions: function(times) returning r (km), lat (radians), lon (radians), ex: SpicePositions("Earth").
+    :param observations: function(starttime, endtime) returning times and observed velocity (km/sec).
+    :param cadence: np.timedelta64, time step of the position index.
+    :param cache_dir: directory of the position index files, default = None (memory only).
+    """
+
+    def __init__(self, name, positions, observations, cadence=np.timedelta64(1, "h"), cache_dir=None):
+        self.name = name
+        self.positions = positions
+        self.observations = observations
+        self.cadence = cadence
+        self.cache_dir = cache_dir
+
+    def __call__(self, case_study, starttime, endtime, p, t, r, f, hux_f, hux_b):
+        """ return the metrics of the MHD and HUX-f velocity along the observer, see process_rotation."""
+        times, observed = self.observations(starttime, endtime)
+        index = ObservationIndex.from_interval(self.name, starttime, endtime, self.positions,
+                                               cadence=self.cadence, cache_dir=self.cache_dir).at(times)
+
+        # the MHD cube at the observer position, HUX-f only at the outer boundary (ntheta x nphi), sampled
+        # as a (phi x theta) map whatever the radius of the observer.
+        models = {"mhd": index.sample(f, TrajectorySampler(p, t, r)),
+                  "hux_f": TrajectorySampler(p, t, None).sample(np.transpose(hux_f), index.lon, index.lat)}
+        scores = compare_observations(models, observed)
+        return {key + "_" + self.name: value for key, value in scores.items()}
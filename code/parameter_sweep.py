@@ -0,0 +1,138 @@
+""" Sweep the HUX-f hyper parameters (alpha, rh, r0, omega_rot) against observations, many parameter sets
+are propagated at once along a leading batch axis. """
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from code.hux_propagation import _hux_f_step
+
+PARAMETERS = ("alpha", "rh", "r0", "omega_rot")
+
+
+def parameter_grid(alpha=(0.15,), rh=(50 * 695700,), r0=(30 * 695700,), omega_rot=((2 * np.pi) / (25.38 * 86400),)):
+    """Every combination of the hyper parameter values.
+
+    :param alpha: list of alpha values.
+    :param rh: list of rh values. units = (km).
+    :param r0: list of r0 values. units = (km).
+    :param omega_rot: list of rotation rates. units = (1/sec).
+    :return: array (nsets x 4), columns alpha, rh, r0, omega_rot.
+    """
+    return np.array(list(itertools.product(np.atleast_1d(alpha), np.atleast_1d(rh), np.atleast_1d(r0),
+                                           np.atleast_1d(omega_rot))), dtype=float)
+
+
+def sweep_hux_f(r_initial, dr_vec, dp_vec, params, r_out, observed, metric="rmse", batch_size=64, n_workers=1):
+    """Score HUX-f against observations for many hyper parameter sets, only the slices at r_out are kept.
+
+    The radial grid of each set starts at its own r0: r_vec = r0 + cumsum(dr_vec).
+
+    :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param params: array (nsets x 4) of (alpha, rh, r0, omega_rot), see parameter_grid.
+    :param r_out: list of radii of the observations. units = (km).
+    :param observed: array (len(r_out) x r_initial.shape), observed velocity, nan where there is no data.
+    :param metric: "rmse", "mae", "cc" or a function(v_model, v_observed) returning a float.
+    :param batch_size: number of parameter sets propagated together.
+    :param n_workers: number of worker processes (None = os.cpu_count()), 1 runs in this process.
+    :return: pandas DataFrame, one row per parameter set with the metric and whether the courant
+             condition was violated.
+    """
+    params = np.atleast_2d(np.asarray(params, dtype=float))
+    if params.shape[1] != len(PARAMETERS):
+        raise ValueError("params must have the columns " + str(PARAMETERS))
+    if isinstance(metric, str) and metric not in METRICS:
+        raise ValueError("Unknown metric: " + metric + ", expected one of " + str(list(METRICS)))
+
+    batches = [params[i:i + batch_size] for i in range(0, len(params), batch_size)]
+    args = (r_initial, dr_vec, dp_vec)
+    kwargs = {"r_out": r_out, "observed": observed, "metric": metric}
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers == 1:
+        results = [_score_batch(*args, batch, **kwargs) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(_score_batch, *args, batch, **kwargs) for batch in batches]
+            results = [future.result() for future in futures]
+
+    table = pd.DataFrame(params, columns=PARAMETERS)
+    table["metric"] = np.concatenate([scores for scores, _ in results])
+    table["cfl_violated"] = np.concatenate([violated for _, violated in results])
+    return table
+
+
+def batched_hux_f(r_initial, dr_vec, dp_vec, params, r_out):
+    """Apply HUX-f (with acceleration) for a batch of hyper parameter sets at once.
+
+    :param r_initial: array, initial condition (vr0), phi along the last axis. units = (km/sec).
+    :param dr_vec: 1d array, mesh spacing in r. units = (km)
+    :param dp_vec: 1d array, mesh spacing in p. units = (radians)
+    :param params: array (nbatch x 4) of (alpha, rh, r0, omega_rot).
+    :param r_out: list of output radii. units = (km). each one keeps the closest slice of every set.
+    :return: velocity (nbatch x len(r_out) x r_initial.shape), bool array (nbatch) True where the courant
+             condition was violated.
+    """
+    r_initial = np.asarray(r_initial, dtype=float)
+    dr_vec = np.asarray(dr_vec, dtype=float)
+    dp_vec = np.asarray(dp_vec, dtype=float)
+    # parameters broadcast against the velocity (nbatch x 1 ... x 1).
+    alpha, rh, r0, omega_rot = (np.reshape(col, (-1,) + (1,) * r_initial.ndim) for col in np.transpose(params))
+
+    # slice index of every output radius for every set (nbatch x len(r_out)).
+    r_vec = r0.reshape(-1, 1) + np.concatenate(([0], np.cumsum(dr_vec)))
+    idx_out = np.argmin(np.abs(r_vec[:, None, :] - np.atleast_1d(r_out)[None, :, None]), axis=2)
+
+    v = np.broadcast_to(r_initial, alpha.shape[:1] + r_initial.shape)
+    v_acc = alpha * (v * (1 - np.exp(-r0 / rh)))
+    v = v_acc + v
+
+    v_out = np.zeros(idx_out.shape + r_initial.shape)
+    violated = np.zeros(len(v), dtype=bool)
+    for i in range(len(dr_vec) + 1):
+        rows, cols = np.nonzero(idx_out == i)
+        v_out[rows, cols] = v[rows]
+        # stop marching once the last requested slice is computed.
+        if i == np.max(idx_out):
+            break
+        frac2 = (omega_rot * dr_vec[i]) / dp_vec
+        # courant condition (omega_rot * dr) / (dp * v) > 1.
+        violated |= np.any(frac2 > v[..., :len(dp_vec)], axis=tuple(range(1, v.ndim)))
+        v = _hux_f_step(v, frac2)
+    return v_out, violated
+
+
+def _score_batch(r_initial, dr_vec, dp_vec, params, r_out, observed, metric):
+    """ return the metric and the courant condition flag of every parameter set of the batch."""
+    v_model, violated = batched_hux_f(r_initial, dr_vec, dp_vec, params, r_out)
+    observed = np.broadcast_to(observed, v_model.shape[1:])
+    if isinstance(metric, str):
+        return METRICS[metric](v_model, observed), violated
+    return np.array([metric(v, observed) for v in v_model]), violated
+
+
+def _rmse(v_model, v_observed):
+    """ root mean square error of each set (first axis), nan observations are ignored."""
+    mask = np.isfinite(v_observed)
+    return np.sqrt(np.mean((v_model[:, mask] - v_observed[mask]) ** 2, axis=1))
+
+
+def _mae(v_model, v_observed):
+    """ mean absolute error of each set (first axis), nan observations are ignored."""
+    mask = np.isfinite(v_observed)
+    return np.mean(np.abs(v_model[:, mask] - v_observed[mask]), axis=1)
+
+
+def _cc(v_model, v_observed):
+    """ pearson correlation coefficient of each set (first axis), nan observations are ignored."""
+    mask = np.isfinite(v_observed)
+    model = v_model[:, mask] - np.mean(v_model[:, mask], axis=1, keepdims=True)
+    observed = v_observed[mask] - np.mean(v_observed[mask])
+    return model @ observed / np.sqrt(np.sum(model ** 2, axis=1) * np.sum(observed ** 2))
+
+
+METRICS = {"rmse": _rmse, "mae": _mae, "cc": _cc}
@@ -0,0 +1,129 @@
+""" Run HUX-f and HUX-b over many Carrington rotations in a process pool and collect the metrics. """
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from psipy.model import MASOutput
+
+from tools.MASweb import get_mas_path, download_mas
+from code.carrington_dates import get_time_interval
+from code.hux_propagation import apply_hux_f_model_3d, apply_hux_b_model_3d
+
+
+def process_rotation(case_study, folder="hmi_mast_mas_std_0201", observation_metrics=None):
+    """Download and read the MAS vr cube of one case study, propagate it with HUX-f (30 Rs -> 1 AU)
+    and HUX-b (1 AU -> 30 Rs) and compare both to the MHD solution.
+
+    :param case_study: str, key of get_time_interval, ex: "cr1653".
+    :param folder: MAS run folder on the PSI website.
+    :param observation_metrics: optional function(case_study, starttime, endtime, p, t, r, f, hux_f, hux_b)
+                                returning a dict of extra metrics (e.g. against OMNI or Helios), must be picklable.
+    :return: dict, one row of the metrics table.
+    """
+    start = time.perf_counter()
+    row = {"case_study": case_study, "cr": None, "starttime": None, "endtime": None, "error": None}
+
+    try:
+        starttime, endtime, cr = get_time_interval(case_study)
+        row.update({"cr": cr, "starttime": starttime, "endtime": endtime})
+        vr_model = MASOutput(get_mas_path(cr=cr, folder=folder, variables=["vr"]))['vr']
+        # phi (radians), theta (radians), r (km) and vr (phi x theta x r) in km/s.
+        p = np.asarray(vr_model.phi_coords)
+        t = np.asarray(vr_model.theta_coords)
+        r = 695700 * np.asarray(vr_model.r_coords)
+        # drop the time axis of the psipy data.
+        f = np.reshape(np.asarray(vr_model.data), (len(p), len(t), len(r)))
+        dr_vec = r[1:] - r[:-1]
+        dp_vec = p[1:] - p[:-1]
+
+        # only keep the far boundary of each propagation (ntheta x nphi).
+        hux_f = apply_hux_f_model_3d(f[:, :, 0], dr_vec, dp_vec, r0=r[0], r_out=[r[-1]])[0]
+        hux_b = apply_hux_b_model_3d(f[:, :, -1], dr_vec, dp_vec, r0=r[0], r_out=[r[0]])[0]
+
+        row.update({"nphi": len(p), "ntheta": len(t), "nr": len(r)})
+        row.update(_scores("hux_f", hux_f, f[:, :, -1].T))
+        row.update(_scores("hux_b", hux_b, f[:, :, 0].T))
+
+        if observation_metrics is not None:
+            row.update(observation_metrics(case_study, starttime, endtime, p, t, r, f, hux_f, hux_b))
+
+    except Exception as error:
+        # one failing rotation (missing run, CFL violation ...) should not stop the batch.
+        row["error"] = repr(error)
+
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def run_rotations(case_studies, folder="hmi_mast_mas_std_0201", n_workers=None, observation_metrics=None):
+    """Process many Carrington rotations in parallel and collect the per-rotation metrics.
+
+    :param case_studies: list of get_time_interval keys, ex: ["cr1625", "cr1629"].
+    :param folder: MAS run folder on the PSI website.
+    :param n_workers: number of worker processes (default = os.cpu_count()), 1 runs in this process.
+    :param observation_metrics: optional function, see process_rotation.
+    :return: pandas DataFrame, one row per case study.
+    """
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    kwargs = {"folder": folder, "observation_metrics": observation_metrics}
+
+    # fetch all the missing vr files before the workers start, the workers only read the cache.
+    failed = prefetch_rotations(case_studies, folder=folder)
+    rows = {case_study: _failed_row(case_study, error) for case_study, error in failed.items()}
+    todo = [case_study for case_study in case_studies if case_study not in failed]
+
+    if n_workers == 1:
+        rows.update({case_study: process_rotation(case_study, **kwargs) for case_study in todo})
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {case_study: executor.submit(process_rotation, case_study, **kwargs) for case_study in todo}
+            rows.update({case_study: future.result() for case_study, future in futures.items()})
+
+    return pd.DataFrame([rows[case_study] for case_study in case_studies])
+
+
+def prefetch_rotations(case_studies, folder="hmi_mast_mas_std_0201"):
+    """Download the MAS vr files of the case studies in parallel, the rotations of a failed batch are then
+    retried one at a time.
+
+    :param case_studies: list of get_time_interval keys, ex: ["cr1625", "cr1629"].
+    :param folder: MAS run folder on the PSI website.
+    :return: dict, case study -> error of the rotations that could not be downloaded.
+    """
+    crs = {}
+    for case_study in case_studies:
+        try:
+            crs[case_study] = get_time_interval(case_study)[2]
+        except ValueError:
+            # reported by process_rotation.
+            continue
+
+    try:
+        download_mas(sorted(set(crs.values())), variables=["vr"], folder=folder)
+        return {}
+    except IOError:
+        pass
+
+    errors = {}
+    for cr in sorted(set(crs.values())):
+        try:
+            download_mas([cr], variables=["vr"], folder=folder)
+        except IOError as error:
+            errors[cr] = repr(error)
+    return {case_study: errors[cr] for case_study, cr in crs.items() if cr in errors}
+
+
+def _failed_row(case_study, error):
+    """ return the metrics row of a case study whose MAS files could not be downloaded."""
+    starttime, endtime, cr = get_time_interval(case_study)
+    return {"case_study": case_study, "cr": cr, "starttime": starttime, "endtime": endtime, "error": error,
+            "seconds": 0.}
+
+
+def _scores(name, v_model, v_ref):
+    """ root mean square error and pearson correlation coefficient of v_model against v_ref."""
+    mask = np.isfinite(v_model) & np.isfinite(v_ref)
+    return {"rmse_" + name: np.sqrt(np.mean((v_model[mask] - v_ref[mask]) ** 2)),
+            "cc_" + name: np.corrcoef(v_model[mask], v_ref[mask])[0, 1]}
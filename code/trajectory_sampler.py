@@ -0,0 +1,114 @@
+""" Sample velocity cubes (phi x theta x r) along spacecraft trajectories with vectorized trilinear interpolation. """
+from collections import namedtuple
+
+import numpy as np
+
+# flat grid index and weight of the corners of the cell containing each point (ncorners x points),
+# and the mask of the points outside of the grid.
+Location = namedtuple("Location", ["index", "weights", "outside"])
+
+
+class TrajectorySampler:
+    """Interpolation plan of a (phi x theta x r), (phi x r) or (phi x theta) grid, phi is periodic.
+
+    The grid metadata (uniform spacing or not, periodic extension) is computed once, and the same plan
+    is reused for every cube on this grid (HUX-f, HUX-b, MHD) and every spacecraft.
+
+    ex: sampler = TrajectorySampler(p, t, r)
+        location = sampler.locate(lon, lat, radius)
+        vr_hux_f, vr_hux_b = sampler.sample(hux_f, location=location), sampler.sample(hux_b, location=location)
+
+    :param phi: 1d array, increasing longitude grid, with or without the periodic point phi[0] + period. units = (radians)
+    :param theta: 1d array, increasing latitude grid, None for (phi x r) cubes. units = (radians)
+    :param r: 1d array, increasing radial grid, None for (phi x theta) maps.
+    :param period: float, period of phi. units = (radians)
+    """
+
+    def __init__(self, phi, theta, r, period=2 * np.pi):
+        self.period = period
+        self.shape = tuple(len(axis) for axis in (phi, theta, r) if axis is not None)
+
+        # add the periodic point if the grid does not have it, it maps back to phi[0].
+        phi = np.asarray(phi, dtype=float)
+        if phi[-1] < phi[0] + period * (1 - 1e-10):
+            phi = np.append(phi, phi[0] + period)
+        self.axes = [_Axis(phi, periodic=True, size=self.shape[0])]
+        self.axes += [_Axis(np.asarray(x, dtype=float)) for x in (theta, r) if x is not None]
+
+    def locate(self, phi, theta, r):
+        """Grid indices and interpolation weights of the points, to reuse with sample().
+
+        :param phi: array, longitude of the points. units = (radians)
+        :param theta: array, latitude of the points, None for (phi x r) cubes. units = (radians)
+        :param r: array, radius of the points, same units as the grid, None for (phi x theta) maps.
+        :return: Location.
+        """
+        coords = [x for x in (phi, theta, r) if x is not None]
+        if len(coords) != len(self.axes):
+            raise ValueError("Expected " + str(len(self.axes)) + " coordinates, got " + str(len(coords)))
+
+        coords = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in coords])
+        located = [axis.locate(x, self.period) for axis, x in zip(self.axes, coords)]
+        outside = np.any([out for _, _, _, out in located], axis=0)
+
+        # build the corners one axis at a time, flat index = sum of index * stride of each axis.
+        strides = np.cumprod((1,) + self.shape[:0:-1])[::-1]
+        index = np.zeros((1,) + outside.shape, dtype=int)
+        weights = np.ones((1,) + outside.shape)
+        for stride, (lower, upper, w, _) in zip(strides, located):
+            index = np.concatenate([index + lower * stride, index + upper * stride])
+            weights = np.concatenate([weights * (1 - w), weights * w])
+        return Location(index, weights, outside)
+
+    def sample(self, cube, phi=None, theta=None, r=None, location=None, fill_value=np.nan):
+        """Multilinear interpolation of the cube at the points.
+
+        :param cube: array (... x nphi x ntheta x nr), (... x nphi x nr) or (... x nphi x ntheta), leading axes
+                     are sampled together.
+        :param phi, theta, r: coordinates of the points, see locate (ignored if location is given).
+        :param location: Location returned by locate.
+        :param fill_value: value of the points outside of the grid.
+        :return: array (... x number of points).
+        """
+        cube = np.asarray(cube)
+        if cube.shape[cube.ndim - len(self.shape):] != self.shape:
+            raise ValueError("Cube shape " + str(cube.shape) + " does not match the grid " + str(self.shape))
+        if location is None:
+            location = self.locate(phi, theta, r)
+
+        # weighted sum over the corners of the cell containing each point.
+        flat = cube.reshape(cube.shape[:cube.ndim - len(self.shape)] + (-1,))
+        values = np.sum(flat[..., location.index] * location.weights, axis=-len(location.index.shape))
+        return np.where(location.outside, fill_value, values)
+
+
+class _Axis:
+    """ one grid axis, uniform axes are located arithmetically, the other ones by binary search."""
+
+    def __init__(self, x, periodic=False, size=None):
+        if len(x) < 2 or np.any(np.diff(x) <= 0):
+            raise ValueError("Grid axes must be increasing with at least 2 points.")
+        self.x = x
+        self.periodic = periodic
+        self.size = len(x) if size is None else size
+        dx = np.diff(x)
+        self.uniform = np.allclose(dx, dx[0], rtol=1e-6, atol=0)
+        self.dx = dx[0]
+
+    def locate(self, x, period):
+        """ return the lower and upper grid index, the weight of the upper point and the outside mask."""
+        if self.periodic:
+            x = self.x[0] + np.mod(x - self.x[0], period)
+
+        if self.uniform:
+            s = (x - self.x[0]) / self.dx
+            i = np.clip(np.floor(np.nan_to_num(s)).astype(int), 0, len(self.x) - 2)
+            w = s - i
+        else:
+            i = np.clip(np.searchsorted(self.x, np.nan_to_num(x), side="right") - 1, 0, len(self.x) - 2)
+            w = (x - self.x[i]) / (self.x[i + 1] - self.x[i])
+
+        outside = (w < -1e-10) | (w > 1 + 1e-10) | np.isnan(x)
+        w = np.clip(w, 0, 1)
+        # the periodic point maps back to the first one.
+        return i, (i + 1) % self.size, w, outside
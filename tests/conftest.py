@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the repository root provides the code and tools packages (code shadows the standard library module).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if 'code' in sys.modules and not hasattr(sys.modules['code'], '__path__'):
+    del sys.modules['code']
@@ -0,0 +1,52 @@
+""" Tests of the ensemble propagation. """
+import numpy as np
+import pytest
+
+from code.ensemble import perturb_boundary, ensemble_statistics
+from code.numerical_methods import apply_numerical_method
+
+OMEGA_ROT = (2 * np.pi) / (25.38 * 86400)
+
+
+@pytest.fixture
+def grid():
+    p = np.linspace(0, 2 * np.pi, 65)
+    dp_vec = np.diff(p)
+    dr_vec = np.full(40, 0.8 * dp_vec[0] * 300 / OMEGA_ROT)
+    v0 = 400 + 200 * (np.sin(2 * p) + 1) / 2
+    v0[-1] = v0[0]
+    return v0, dr_vec, dp_vec
+
+
+def test_perturb_boundary(grid):
+    v0, _, _ = grid
+    members = perturb_boundary(v0, 500, sigma=20., correlation_length=0.3, seed=0)
+    assert members.shape == (500, len(v0))
+    np.testing.assert_array_equal(members[:, -1], members[:, 0])
+    assert abs(np.std(members - v0) - 20.) < 1.
+    np.testing.assert_array_equal(members, perturb_boundary(v0, 500, sigma=20., correlation_length=0.3, seed=0))
+
+
+@pytest.mark.parametrize("backend", ["numpy", "numba"])
+def test_ensemble_statistics(grid, backend):
+    v0, dr_vec, dp_vec = grid
+    members = perturb_boundary(v0, 20, seed=1)
+    r_out = [30 * 695700 + np.sum(dr_vec[:20]), 30 * 695700 + np.sum(dr_vec)]
+    stats = ensemble_statistics(dr_vec, dp_vec, r_out, members=members, batch_size=7, return_members=True,
+                                backend=backend)
+
+    assert stats["mean"].shape == stats["std"].shape == (2, len(v0))
+    assert stats["quantiles"].shape == (3, 2, len(v0))
+    for i in (0, 13):
+        expected = apply_numerical_method(members[i], dr_vec, dp_vec, r_out=r_out, backend=backend)
+        np.testing.assert_allclose(stats["members"][i], expected, rtol=1e-12)
+    np.testing.assert_allclose(stats["mean"], np.mean(stats["members"], axis=0))
+    np.testing.assert_allclose(stats["quantiles"][1], np.median(stats["members"], axis=0))
+
+
+def test_ensemble_statistics_requires_a_vectorized_backend(grid):
+    v0, dr_vec, dp_vec = grid
+    with pytest.raises(ValueError, match="backend"):
+        ensemble_statistics(dr_vec, dp_vec, [30 * 695700], r_initial=v0, n_members=3, backend="python")
+    with pytest.raises(ValueError, match="members or r_initial"):
+        ensemble_statistics(dr_vec, dp_vec, [30 * 695700])
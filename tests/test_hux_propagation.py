@@ -0,0 +1,59 @@
+""" Tests of the HUX propagation. """
+import copy
+
+import numpy as np
+import pytest
+
+from code.hux_propagation import HUXPlan, iter_hux_f_time_dependent, forward_radial_boosting, \
+    backwards_radial_boosting
+
+
+def test_iter_hux_f_time_dependent_yields_independent_arrays():
+    p = np.linspace(0, 2 * np.pi, 65)
+    dr_vec, dp_vec = np.full(50, 1e6), np.diff(p)
+    maps = [400 + 50 * np.sin(p + k) for k in range(4)]
+
+    plan = HUXPlan(dr_vec, dp_vec)
+    solutions = list(iter_hux_f_time_dependent(enumerate(maps), dr_vec, dp_vec))
+    for (_, v), r_initial in zip(solutions, maps):
+        np.testing.assert_array_equal(v, plan.forward(r_initial))
+
+
+def baseline_boosting(r_vec, v_vec, p_vec, nr=30, omega_rot=(2 * np.pi) / (25.38 * 86400), forward=True):
+    """ the cell by cell loops of forward/backwards_radial_boosting before they were vectorized."""
+    r_grid = np.linspace(np.min(r_vec), np.max(r_vec), nr)
+    dr_vec = r_grid[1:] - r_grid[:-1]
+    dp_vec = p_vec[1:] - p_vec[:-1]
+    v_mod = copy.deepcopy(v_vec)
+    for ii in range(len(dr_vec)):
+        dr = dr_vec[ii]
+        for jj in range(len(dp_vec) + 1):
+            if r_vec[jj] < r_grid[ii]:
+                if forward:
+                    if jj == len(dp_vec):
+                        v_mod[-1] = v_mod[0]
+                    else:
+                        frac1 = (v_mod[jj + 1] - v_mod[jj]) / v_mod[jj]
+                        frac2 = (omega_rot * dr) / dp_vec[jj]
+                        v_mod[jj] = v_mod[jj] + frac1 * frac2
+                else:
+                    frac2 = (omega_rot * dr) / dp_vec[jj if jj != len(dp_vec) else 0]
+                    frac1 = (v_mod[jj - 1] - v_mod[jj]) / v_mod[jj]
+                    v_mod[jj] = v_mod[jj] + frac1 * frac2
+    return v_mod
+
+
+@pytest.fixture
+def trajectory():
+    p_vec = np.linspace(0, 2 * np.pi, 101)
+    r_vec = 1.496e8 * (0.65 + 0.35 * np.cos(p_vec))
+    v_vec = 400 + 200 * (np.sin(3 * p_vec) + 1) / 2
+    return r_vec, v_vec, p_vec
+
+
+def test_radial_boosting_matches_the_baseline(trajectory):
+    r_vec, v_vec, p_vec = trajectory
+    np.testing.assert_array_equal(forward_radial_boosting(r_vec, v_vec, p_vec),
+                                  baseline_boosting(r_vec, v_vec, p_vec, forward=True))
+    np.testing.assert_array_equal(backwards_radial_boosting(r_vec, v_vec, p_vec),
+                                  baseline_boosting(r_vec, v_vec, p_vec, forward=False))
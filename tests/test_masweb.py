@@ -0,0 +1,155 @@
+""" Tests of the MAS download manager against a local http server standing in for the PSI website. """
+import functools
+import http.server
+import json
+import multiprocessing as mp
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from tools.MASweb import download_mas, MASCache
+
+FOLDER = "hmi_mast_mas_std_0201"
+
+
+def content(cr, var):
+    """ return the bytes served for a rotation and variable."""
+    return (str(cr) + var).encode() * 1000
+
+
+class _Handler(http.server.SimpleHTTPRequestHandler):
+    requests = []
+    # paths whose GET response is cut short, HEAD still gives the full size.
+    truncated = set()
+
+    def do_GET(self):
+        _Handler.requests.append(self.path)
+        if self.path in _Handler.truncated:
+            body = (Path(self.directory) / self.path.lstrip('/')).read_bytes()[:100]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """ serve cr2200 ... cr2209 vr and br files, return the url template."""
+    site = tmp_path / 'site'
+    for cr in range(2200, 2210):
+        helio = site / ('cr' + str(cr) + '-medium') / FOLDER / 'helio'
+        helio.mkdir(parents=True)
+        for var in ("vr", "br"):
+            (helio / (var + '002.hdf')).write_bytes(content(cr, var))
+
+    _Handler.requests = []
+    _Handler.truncated = set()
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_Handler, directory=str(site)))
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:' + str(httpd.server_address[1]) + '/cr{cr}-medium/{folder}/helio/{var}002.hdf'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def check_rotation(mas_dir, cr, variables):
+    for var in variables:
+        assert (mas_dir / (var + '002.hdf')).read_bytes() == content(cr, var)
+
+
+def _download(args):
+    crs, cache_root, base_url = args
+    return {cr: str(path) for cr, path in download_mas(crs, variables=("vr", "br"), cache_root=cache_root,
+                                                         base_url=base_url).items()}
+
+
+def test_download_and_cache_hit(server, tmp_path):
+    cache_root = tmp_path / 'cache'
+    mas_dirs = download_mas([2200, 2201], variables=("vr", "br"), cache_root=cache_root, base_url=server)
+    assert len(_Handler.requests) == 4
+    for cr in (2200, 2201):
+        check_rotation(mas_dirs[str(cr)], cr, ("vr", "br"))
+
+    # second call: served from the cache, no request.
+    mas_dirs = download_mas([2200, 2201], variables=("vr", "br"), cache_root=cache_root, base_url=server)
+    assert len(_Handler.requests) == 4
+    check_rotation(mas_dirs["2201"], 2201, ("vr", "br"))
+    assert len(json.loads((cache_root / 'index.json').read_text())) == 4
+    assert not list(cache_root.glob('tmp*'))
+
+
+def test_failed_download(server, tmp_path):
+    with pytest.raises(IOError):
+        download_mas([2200, 2300], cache_root=tmp_path / 'cache', base_url=server)
+    # the successful file is still cached.
+    index = MASCache(tmp_path / 'cache').read_index()
+    assert list(index) == [server.format(cr=2200, folder=FOLDER, var="vr")]
+
+
+def test_concurrent_download(server, tmp_path):
+    cache_root = tmp_path / 'cache'
+    jobs = [([2200, 2201, 2202, 2203], cache_root, server), ([2202, 2203, 2204, 2205], cache_root, server)] * 2
+    with ProcessPoolExecutor(max_workers=2, mp_context=mp.get_context('spawn')) as executor:
+        results = list(executor.map(_download, jobs, timeout=60))
+
+    for mas_dirs in results:
+        for cr, path in mas_dirs.items():
+            check_rotation(Path(path), int(cr), ("vr", "br"))
+    index = MASCache(cache_root).read_index()
+    assert len(index) == 12
+    assert len(list((cache_root / 'objects').glob('*.hdf'))) == 12
+    assert not list(cache_root.glob('tmp*'))
+
+
+def test_eviction(server, tmp_path):
+    cache_root = tmp_path / 'cache'
+    size = len(content(2200, "vr"))
+    download_mas([2200, 2201], cache_root=cache_root, base_url=server)
+    mas_dirs = download_mas([2202, 2203], cache_root=cache_root, base_url=server, max_cache_size=2 * size)
+
+    index = MASCache(cache_root).read_index()
+    assert sorted(index) == [server.format(cr=cr, folder=FOLDER, var="vr") for cr in (2202, 2203)]
+    assert len(list((cache_root / 'objects').glob('*.hdf'))) == 2
+    check_rotation(mas_dirs["2203"], 2203, ("vr",))
+    # the links to the evicted files are removed.
+    assert not (cache_root / 'mas_helio' / FOLDER / 'cr2200' / 'vr002.hdf').is_symlink()
+
+    # an evicted rotation is downloaded again.
+    n = len(_Handler.requests)
+    mas_dirs = download_mas([2200], cache_root=cache_root, base_url=server)
+    assert len(_Handler.requests) == n + 1
+    check_rotation(mas_dirs["2200"], 2200, ("vr",))
+
+
+def test_truncated_download(server, tmp_path):
+    cache_root = tmp_path / 'cache'
+    url = server.format(cr=2200, folder=FOLDER, var="vr")
+    _Handler.truncated.add(url[url.index('/cr'):])
+    with pytest.raises(IOError):
+        download_mas([2200], cache_root=cache_root, base_url=server)
+    assert MASCache(cache_root).read_index() == {}
+
+    _Handler.truncated.clear()
+    check_rotation(download_mas([2200], cache_root=cache_root, base_url=server)["2200"], 2200, ("vr",))
+
+
+def test_legacy_layout(server, tmp_path):
+    cache_root = tmp_path / 'cache'
+    for cr, data in ((2200, content(2200, "vr")), (2201, content(2201, "vr")[:100])):
+        legacy = cache_root / 'mas_helio' / ('cr' + str(cr))
+        legacy.mkdir(parents=True)
+        (legacy / 'vr002.hdf').write_bytes(data)
+
+    # the complete legacy file is imported, the truncated one is downloaded again.
+    mas_dirs = download_mas([2200, 2201], cache_root=cache_root, base_url=server)
+    assert _Handler.requests == ['/cr2201-medium/' + FOLDER + '/helio/vr002.hdf']
+    check_rotation(mas_dirs["2200"], 2200, ("vr",))
+    check_rotation(mas_dirs["2201"], 2201, ("vr",))
+    assert len(MASCache(cache_root).read_index()) == 2
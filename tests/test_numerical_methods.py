@@ -0,0 +1,31 @@
+""" Tests of the numerical methods backends. """
+import numpy as np
+
+from code.flux_limiters import LIMITERS, register_limiter
+from code.numerical_methods import apply_numerical_method
+
+OMEGA_ROT = (2 * np.pi) / (25.38 * 86400)
+
+
+class Clipped:
+    """ a flux-limiter object numba cannot compile."""
+
+    def __call__(self, theta):
+        return np.clip(theta, 0., 1.)
+
+
+def test_auto_falls_back_to_numpy_for_limiters_numba_cannot_compile():
+    p = np.linspace(0, 2 * np.pi, 65)
+    dp_vec = np.diff(p)
+    dr_vec = np.full(40, 0.8 * dp_vec[0] * 300 / OMEGA_ROT)
+    v0 = 400 + 200 * (np.sin(2 * p) + 1) / 2
+
+    register_limiter("clipped", Clipped())
+    try:
+        expected = apply_numerical_method(v0, dr_vec, dp_vec, flux_function="clipped", backend="numpy")
+        np.testing.assert_array_equal(apply_numerical_method(v0, dr_vec, dp_vec, flux_function="clipped"),
+                                      expected)
+        np.testing.assert_array_equal(apply_numerical_method(v0, dr_vec, dp_vec, flux_function="clipped",
+                                                             backend="auto"), expected)
+    finally:
+        del LIMITERS["clipped"]
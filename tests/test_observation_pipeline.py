@@ -0,0 +1,31 @@
+""" Tests of the observation pipeline. """
+import numpy as np
+
+from code import observation_pipeline
+from code.observation_pipeline import ObservationIndex
+from code.trajectory_sampler import TrajectorySampler
+
+
+def fixed_positions(times):
+    return np.full(len(times), 215 * 695700.), np.zeros(len(times)), np.zeros(len(times))
+
+
+def test_index_file_depends_on_cadence(tmp_path):
+    hourly = ObservationIndex.from_interval("earth", "2000-01-01", "2000-01-02", fixed_positions,
+                                            cache_dir=str(tmp_path))
+    observation_pipeline._INDEX_CACHE.clear()
+    ten_minutes = ObservationIndex.from_interval("earth", "2000-01-01", "2000-01-02", fixed_positions,
+                                                 cadence=np.timedelta64(10, "m"), cache_dir=str(tmp_path))
+    assert len(hourly.times) == 25
+    assert len(ten_minutes.times) == 145
+
+
+def test_map_sampling_matches_the_cube():
+    rng = np.random.default_rng(0)
+    p, t, r = np.linspace(0, 2 * np.pi, 37)[:-1], np.linspace(-1.5, 1.5, 19), np.linspace(30, 215, 5)
+    v_map = rng.random((len(p), len(t)))
+    cube = np.repeat(v_map[:, :, None], len(r), axis=-1)
+    lon, lat = rng.uniform(0, 2 * np.pi, 50), rng.uniform(-1.5, 1.5, 50)
+
+    sampled = TrajectorySampler(p, t, None).sample(v_map, lon, lat)
+    np.testing.assert_allclose(sampled, TrajectorySampler(p, t, r).sample(cube, lon, lat, np.full(50, 100.)))
@@ -0,0 +1,49 @@
+""" Tests of the PSI hdf readers. """
+import os
+
+import numpy as np
+import pytest
+
+from tools.psihdf import wrhdf_3d, rdhdf
+
+
+def test_cache_is_kept_out_of_the_data_directory(tmp_path):
+    data_dir = tmp_path / "run"
+    data_dir.mkdir()
+    hdf_filename = str(data_dir / "vr002.hdf")
+    x, y, z = np.linspace(0, 2 * np.pi, 8), np.linspace(0, np.pi, 5), np.linspace(1, 30, 4)
+    f = np.random.default_rng(0).random((4, 5, 8)).astype(np.float32)
+    wrhdf_3d(hdf_filename, x, y, z, f)
+
+    expected = rdhdf(hdf_filename)
+    for _ in range(2):
+        cached = rdhdf(hdf_filename, cache=str(tmp_path / "cache"))
+        for a, b in zip(expected, cached):
+            np.testing.assert_array_equal(a, b)
+
+    assert os.listdir(data_dir) == ["vr002.hdf"]
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+
+def test_cache_does_not_break_psipy(tmp_path):
+    model = pytest.importorskip("psipy.model")
+    x, y, z = np.linspace(0, 2 * np.pi, 8), np.linspace(0, np.pi, 5), np.linspace(1, 30, 4)
+    wrhdf_3d(str(tmp_path / "vr002.hdf"), x, y, z, np.ones((4, 5, 8), dtype=np.float32))
+    rdhdf(str(tmp_path / "vr002.hdf"), cache=str(tmp_path / "cache"))
+    assert np.size(model.MASOutput(str(tmp_path))['vr'].data) == 4 * 5 * 8
+
+
+def test_open_files_are_shared_with_psihdf4(tmp_path):
+    from tools import psihdf, psihdf4
+
+    hdf_filename = str(tmp_path / "br002.hdf")
+    x, y = np.linspace(0, 1, 6), np.linspace(0, 1, 4)
+    psihdf4.wrhdf_2d(hdf_filename, x, y, np.zeros((4, 6)))
+    psihdf4.rdhdf(hdf_filename, keep_open=True)
+    assert os.path.abspath(hdf_filename) in psihdf._OPEN_SD
+
+    # a file kept open by one module is released by the writers and close_hdf of the other.
+    psihdf.wrhdf_2d(hdf_filename, x, y, np.ones((4, 6)))
+    np.testing.assert_array_equal(psihdf4.rdhdf_2d(hdf_filename, keep_open=True)[2], np.ones((4, 6)))
+    psihdf.close_hdf()
+    assert not psihdf4._OPEN_SD
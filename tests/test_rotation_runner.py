@@ -0,0 +1,16 @@
+""" Tests of the Carrington rotation runner. """
+from code import rotation_runner
+
+
+def test_unknown_case_study_is_reported(monkeypatch):
+    def missing(*args, **kwargs):
+        raise IOError("missing run")
+
+    monkeypatch.setattr(rotation_runner, "download_mas", lambda *args, **kwargs: None)
+    monkeypatch.setattr(rotation_runner, "get_mas_path", missing)
+
+    table = rotation_runner.run_rotations(["cr1653", "bogus"], n_workers=1)
+    assert list(table["case_study"]) == ["cr1653", "bogus"]
+    assert table["cr"][0] == "1653"
+    assert "missing run" in table["error"][0]
+    assert "Unknown case study: bogus" in table["error"][1]
@@ -1,34 +1,276 @@
 """ Read in MAS results from PSI (Predictive Science inc.) website"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
 from pathlib import Path
+
 from parfive import Downloader
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+BASE_URL = 'http://www.predsci.com/data/runs/cr{cr}-medium/{folder}/helio/{var}002.hdf'
+
 
-def get_mas_path(cr, folder="hmi_mast_mas_std_0201"):
+def get_mas_path(cr, folder="hmi_mast_mas_std_0201", variables=("rho", "vr", "br"), cache_root=None, **kwargs):
     """Get MAS website results.
 
     :param cr: carrington rotation. ex: 2210
+    :param folder: MAS run folder on the PSI website.
+    :param variables: MAS variables to download, ex: ["vr"].
+    :param cache_root: cache directory, see download_mas.
+    :param kwargs: other arguments of download_mas (max_conn, max_cache_size, verify, base_url).
     :return: mas_path
     """
-    download_dir = Path.cwd() / '..' / '..' / 'data'
-    
-    cr_string = 'mas_helio/cr' + str(cr)
-    mas_helio_dir = download_dir / cr_string 
-    mas_helio_dir.mkdir(parents=True, exist_ok=True)
-
-    base_url = 'http://www.predsci.com/data/runs/cr' + str(cr) + '-medium/' + folder + '/helio/{var}002.hdf'
-
-    # Create a downloader to queue the files to be downloaded
-    dl = Downloader()
-
-    for var in ['rho', 'vr', 'br']:
-        file = mas_helio_dir / f'{var}002.hdf'
-        if file.exists():
-            continue
-        else:
-            remote_file = base_url.format(var=var)
-            dl.enqueue_file(remote_file, path=mas_helio_dir)
-
-    # Download the files
-    if dl.queued_downloads > 0:
-        dl.download()
-    return mas_helio_dir.resolve()
\ No newline at end of file
+    return download_mas([cr], variables=variables, folder=folder, cache_root=cache_root, **kwargs)[str(cr)]
+
+
+def download_mas(crs, variables=("vr",), folder="hmi_mast_mas_std_0201", cache_root=None, max_conn=5,
+                 max_cache_size=None, verify=False, base_url=BASE_URL):
+    """Download the MAS results of many carrington rotations in parallel, each file is fetched once.
+
+    The files are stored in a content-addressed cache (cache_root/objects/<sha256>.hdf) and linked in
+    cache_root/mas_helio/<folder>/cr<cr>/<var>002.hdf so the rotation directories can be read by psipy.
+    Files of the previous layout (cache_root/mas_helio/cr<cr>/<var>002.hdf, which did not depend on folder)
+    are imported into the cache instead of being downloaded again.
+
+    Every new file (downloaded or imported) must have the size given by the server (Content-Length of a
+    HEAD request, when the server gives it), truncated files are reported as failed downloads.
+
+    :param crs: list of carrington rotations. ex: [2210, 2211]
+    :param variables: list of MAS variables. ex: ["rho", "vr", "br"]
+    :param folder: MAS run folder on the PSI website.
+    :param cache_root: cache directory, default = $MAS_CACHE_ROOT or ../../data relative to the working directory.
+    :param max_conn: maximum number of parallel connections.
+    :param max_cache_size: maximum size of the cache (bytes), least recently used files are removed first.
+                           default = None (no limit).
+    :param verify: if True, check the sha256 of the cached files against the index and download the
+                   corrupted ones again.
+    :param base_url: url template with {cr}, {folder} and {var} fields.
+    :return: dict, cr (str) -> path of the rotation directory.
+    """
+    cache = MASCache(cache_root)
+    mas_dirs = {}
+    requested = {}
+    missing = []
+
+    with cache.lock():
+        index = cache.read_index()
+        for cr in crs:
+            mas_helio_dir = cache.root / 'mas_helio' / folder / ('cr' + str(cr))
+            mas_helio_dir.mkdir(parents=True, exist_ok=True)
+            mas_dirs[str(cr)] = mas_helio_dir.resolve()
+
+            for var in variables:
+                url = base_url.format(cr=cr, folder=folder, var=var)
+                link = mas_helio_dir / f'{var}002.hdf'
+                if cache.lookup(index, url, verify=verify):
+                    cache.link(index[url]["sha256"], link)
+                    requested[url] = index[url]
+                else:
+                    missing.append((url, link))
+        cache.write_index(index)
+
+    # Download the missing files, each call has its own temporary directory.
+    failed = []
+    if missing:
+        download_dir = Path(tempfile.mkdtemp(dir=cache.root, prefix='tmp'))
+        try:
+            dl = Downloader(max_conn=max_conn, progress=False, overwrite=True)
+            sizes = {}
+            for i, (url, link) in enumerate(missing):
+                file = download_dir / (str(i) + '_' + link.name)
+                # file of the previous layout, imported if it is complete.
+                legacy = cache.root / 'mas_helio' / link.parent.name / link.name
+                if legacy.is_file():
+                    sizes[url] = remote_size(url)
+                    if sizes[url] in (None, legacy.stat().st_size):
+                        _copy(legacy, file)
+                        continue
+                dl.enqueue_file(url, path=download_dir, filename=file.name)
+            if dl.queued_downloads > 0:
+                results = dl.download()
+                failed = [str(error.url) for error in results.errors]
+
+            for i, (url, link) in enumerate(missing):
+                file = download_dir / (str(i) + '_' + link.name)
+                if url in failed or not file.exists():
+                    continue
+                if url not in sizes:
+                    sizes[url] = remote_size(url)
+                if sizes[url] not in (None, file.stat().st_size):
+                    # truncated download.
+                    failed.append(url)
+                    continue
+                requested[url] = cache.store(file)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+    # merge with the index written by the other processes in the meantime.
+    with cache.lock():
+        index = cache.read_index()
+        index.update(requested)
+        for url, link in missing:
+            if url in requested:
+                cache.link(requested[url]["sha256"], link)
+        cache.evict(index, max_cache_size, keep=requested)
+        cache.write_index(index)
+
+    if failed:
+        raise IOError("Failed to download: " + ", ".join(failed))
+    return mas_dirs
+
+
+class MASCache:
+    """Content-addressed cache of the MAS files.
+
+    index.json maps each url to the sha256, size (bytes) and last access time (seconds) of its file.
+    The index and the links are only modified under lock() so many processes can share the cache.
+    """
+
+    def __init__(self, cache_root=None):
+        if cache_root is None:
+            cache_root = os.environ.get("MAS_CACHE_ROOT", Path.cwd() / '..' / '..' / 'data')
+        self.root = Path(cache_root)
+        self.objects = self.root / 'objects'
+        self.objects.mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, sha256):
+        """ return the path of the cached file with this checksum."""
+        return self.objects / (sha256 + '.hdf')
+
+    @contextmanager
+    def lock(self):
+        """ exclusive lock of the cache between processes (no-op where fcntl is not available)."""
+        with open(self.root / 'index.lock', 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_index(self):
+        """ return the cache index, an empty index if there is none yet."""
+        try:
+            with open(self.root / 'index.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index):
+        """ atomically replace the cache index."""
+        tmp = self.root / ('index.json.' + str(os.getpid()) + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.root / 'index.json')
+
+    def lookup(self, index, url, verify=False):
+        """Check that the file of url is in the cache (right size, and right checksum if verify)
+        and mark it as recently used, invalid entries are removed from the index.
+
+        :return: bool.
+        """
+        entry = index.get(url)
+        if entry is None:
+            return False
+
+        path = self.object_path(entry["sha256"])
+        if not path.exists() or path.stat().st_size != entry["size"] or \
+                (verify and file_sha256(path) != entry["sha256"]):
+            del index[url]
+            return False
+
+        entry["last_access"] = time.time()
+        return True
+
+    def store(self, file):
+        """Move a downloaded file into the cache, files with the same content are stored once.
+
+        :param file: path of the downloaded file.
+        :return: index entry of the file.
+        """
+        sha256 = file_sha256(file)
+        os.replace(file, self.object_path(sha256))
+        return {"sha256": sha256, "size": self.object_path(sha256).stat().st_size, "last_access": time.time()}
+
+    def link(self, sha256, link):
+        """ make link point to the cached file (symbolic link, hard link or copy if links are not supported)."""
+        target = self.object_path(sha256).resolve()
+        if link.is_symlink() or link.exists():
+            if link.resolve() == target:
+                return
+            link.unlink()
+        try:
+            link.symlink_to(target)
+        except OSError:
+            try:
+                os.link(target, link)
+            except OSError:
+                shutil.copyfile(target, link)
+
+    def evict(self, index, max_cache_size=None, keep=()):
+        """Remove the least recently used files until the cache is smaller than max_cache_size (bytes).
+        Files that are used by more than one url are counted once.
+
+        :param keep: urls that are never removed, e.g. the files of the current request.
+        """
+        if max_cache_size is None:
+            return
+
+        entries = sorted(index.items(), key=lambda item: item[1]["last_access"])
+        sizes = {entry["sha256"]: entry["size"] for _, entry in entries}
+        total = sum(sizes.values())
+
+        evicted = False
+        for url, entry in entries:
+            if total <= max_cache_size:
+                break
+            if url in keep:
+                continue
+            del index[url]
+            if all(other["sha256"] != entry["sha256"] for other in index.values()):
+                self.object_path(entry["sha256"]).unlink(missing_ok=True)
+                total -= entry["size"]
+                evicted = True
+
+        # remove the links to the evicted files.
+        if evicted:
+            for link in self.root.glob('mas_helio/*/cr*/*.hdf'):
+                if link.is_symlink() and not link.exists():
+                    link.unlink()
+
+
+def remote_size(url, timeout=30):
+    """ return the size (bytes) of the file at url from the Content-Length of a HEAD request, None if unknown."""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method='HEAD'), timeout=timeout) as response:
+            length = response.headers.get('Content-Length')
+    except (OSError, ValueError):
+        return None
+    return None if length is None else int(length)
+
+
+def _copy(source, destination):
+    """ hard link source to destination, copy it if hard links are not supported."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def file_sha256(file, chunk_size=2 ** 20):
+    """ return the sha256 hex digest of a file."""
+    sha256 = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
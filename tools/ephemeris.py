@@ -0,0 +1,137 @@
+""" Offline ephemeris store: spacecraft and planet positions in the Carrington frame precomputed at a fixed cadence,
+so the analyses can run without heliopy spice kernels or network. """
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+COLUMNS = ("r", "lat", "lon")
+
+
+class EphemerisStore:
+    """Directory of precomputed trajectories, one sub directory per body with a float32 .npy file per column
+    (r in km, Carrington lat and lon in radians) and a meta.json describing the time grid.
+
+    ex: store = EphemerisStore()
+        store.precompute("Earth", dt.datetime(1974, 12, 1), dt.datetime(1981, 1, 1))
+        earth = store.ephemeris("Earth")
+        r, lat, lon = earth(omni_data.index)
+        omni_index = ObservationIndex.from_rotation(1653, earth, "earth")
+
+    :param root: store directory, default = $EPHEMERIS_ROOT or ../../data/ephemeris relative to the working directory.
+    """
+
+    def __init__(self, root=None):
+        if root is None:
+            root = os.environ.get("EPHEMERIS_ROOT", Path.cwd() / '..' / '..' / 'data' / 'ephemeris')
+        self.root = Path(root)
+
+    def body_dir(self, body):
+        """ return the directory of a body. ex: "Helios 1" -> root/helios_1"""
+        return self.root / body.lower().replace(' ', '_')
+
+    def precompute(self, body, starttime, endtime, cadence=np.timedelta64(1, "h"), positions=None, kernel=None,
+                   chunk_size=100000):
+        """Compute and save the positions of a body from starttime to endtime (included) at a fixed cadence.
+
+        :param body: spice body name. ex: "Earth", "Helios 1"
+        :param starttime: datetime.datetime or np.datetime64.
+        :param endtime: datetime.datetime or np.datetime64.
+        :param cadence: np.timedelta64, time step, small enough for the longitude to change by less than pi.
+        :param positions: function(times) returning r (km), lat (radians), lon (radians),
+                          default = heliopy spice (SpicePositions).
+        :param kernel: heliopy kernel of the body, used by the default positions. ex: "helios1"
+        :param chunk_size: number of times computed at once.
+        :return: Ephemeris.
+        """
+        if positions is None:
+            from code.observation_pipeline import SpicePositions
+            positions = SpicePositions(body, kernel=kernel)
+
+        starttime = np.datetime64(starttime, "s")
+        cadence = np.timedelta64(cadence, "s")
+        n = int((np.datetime64(endtime, "s") - starttime) // cadence) + 1
+        if n < 2:
+            raise ValueError("The interval must contain at least 2 times.")
+
+        path = self.body_dir(body)
+        path.mkdir(parents=True, exist_ok=True)
+        # meta.json is written last, a store without it is incomplete.
+        (path / 'meta.json').unlink(missing_ok=True)
+
+        columns = {name: np.lib.format.open_memmap(path / (name + '.npy'), mode='w+', dtype=np.float32, shape=(n,))
+                   for name in COLUMNS}
+        for i in range(0, n, chunk_size):
+            times = starttime + cadence * np.arange(i, min(i + chunk_size, n))
+            for name, values in zip(COLUMNS, positions(times)):
+                columns[name][i:i + len(times)] = values
+        columns["lon"][:] = np.mod(columns["lon"], 2 * np.pi)
+        for column in columns.values():
+            column.flush()
+        del columns
+
+        meta = {"body": body, "frame": "IAU_SUN", "start": str(starttime), "cadence_seconds": int(cadence.astype(int)),
+                "n": n, "columns": list(COLUMNS), "units": {"r": "km", "lat": "rad", "lon": "rad"}}
+        with open(path / 'meta.json.tmp', 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(path / 'meta.json.tmp', path / 'meta.json')
+        return Ephemeris(path)
+
+    def ephemeris(self, body):
+        """ return the Ephemeris of a body, ValueError if it was not precomputed."""
+        path = self.body_dir(body)
+        if not (path / 'meta.json').exists():
+            raise ValueError("No ephemeris of " + body + " in " + str(self.root) + ", see EphemerisStore.precompute.")
+        return Ephemeris(path)
+
+    def bodies(self):
+        """ return the names of the stored bodies."""
+        return sorted(json.loads(meta.read_text())["body"] for meta in self.root.glob('*/meta.json'))
+
+
+class Ephemeris:
+    """Trajectory of one body, read with memory maps and interpolated linearly at any time.
+    Picklable (only the path is pickled), so it can be used as positions in worker processes.
+
+    :param path: body directory of an EphemerisStore.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+        self.start = np.datetime64(self.meta["start"], "ns")
+        self.cadence = np.timedelta64(self.meta["cadence_seconds"], "s")
+        self.columns = {name: np.load(self.path / (name + '.npy'), mmap_mode='r') for name in COLUMNS}
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    @property
+    def times(self):
+        """ return the time grid (np.datetime64)."""
+        return self.start + self.cadence * np.arange(self.meta["n"])
+
+    def __call__(self, times):
+        """Positions at times, linear interpolation on the uniform time grid (no search), the longitude is
+        interpolated along the shortest arc so that crossing 0/2pi interpolates across the cut.
+
+        :param times: array of np.datetime64 (or datetime.datetime, pandas DatetimeIndex).
+        :return: r (km), lat (radians), lon (radians, in [0, 2pi)), nan outside of the stored interval.
+        """
+        s = (np.asarray(times, dtype="datetime64[ns]") - self.start) / self.cadence
+        n = self.meta["n"]
+        outside = (s < 0) | (s > n - 1) | np.isnan(s)
+        i = np.clip(np.floor(np.nan_to_num(s)).astype(int), 0, n - 2)
+        w = np.clip(s - i, 0, 1)
+
+        r, lat, lon = (self.columns[name] for name in COLUMNS)
+        r_i = r[i] * (1 - w) + r[i + 1] * w
+        lat_i = lat[i] * (1 - w) + lat[i + 1] * w
+        dlon = np.mod(lon[i + 1].astype(float) - lon[i] + np.pi, 2 * np.pi) - np.pi
+        lon_i = np.mod(lon[i] + w * dlon, 2 * np.pi)
+        return tuple(np.where(outside, np.nan, y) for y in (r_i, lat_i, lon_i))
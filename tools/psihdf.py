@@ -1,8 +1,126 @@
+import hashlib
+import os
+import tempfile
+
 import numpy as np
 import pyhdf.SD as h4
 import h5py as h5
 
-def rdh5(h5_filename):
+
+class H5Data:
+    """Lazy view of the Data set of a PSI hdf5 file, only the selected hyperslab is read from disk.
+
+    Contiguous uncompressed data sets are memory mapped, other ones are read through h5py.
+
+    ex: with H5Data("vr002.h5", names=("r", "theta", "phi")) as vr:
+            inner = vr.sel(r=30)                    # shell closest to 30 Rs.
+            band = vr.sel(theta=(1.4, 1.7))         # all the latitudes in the range.
+            cube = vr[::2, ::2, ::2]                # decimated cube.
+
+    :param h5_filename: hdf5 filename.
+    :param names: coordinate name of each axis, default = dimension labels of the file or dim1, dim2, dim3.
+    """
+
+    def __init__(self, h5_filename, names=None):
+        self.h5file = h5.File(h5_filename, 'r')
+        dset = self.h5file['Data']
+        self.shape = dset.shape
+        self.dtype = dset.dtype
+        self.ndim = dset.ndim
+
+        # the scales are small, read them once.
+        self.scales = [np.array(dset.dims[i][0]) if len(dset.dims[i].keys()) != 0 else np.array([])
+                       for i in range(self.ndim)]
+        if names is None:
+            names = [dset.dims[i].label or 'dim' + str(i + 1) for i in range(self.ndim)]
+        if len(names) != self.ndim:
+            raise ValueError("Expected " + str(self.ndim) + " coordinate names, got " + str(len(names)))
+        self.names = tuple(names)
+
+        offset = dset.id.get_offset()
+        if dset.chunks is None and dset.compression is None and offset is not None:
+            self.data = np.memmap(h5_filename, dtype=self.dtype, mode='r', offset=offset, shape=self.shape)
+        else:
+            self.data = dset
+
+    @property
+    def x(self):
+        return self.scales[0] if self.ndim > 0 else np.array([])
+
+    @property
+    def y(self):
+        return self.scales[1] if self.ndim > 1 else np.array([])
+
+    @property
+    def z(self):
+        return self.scales[2] if self.ndim > 2 else np.array([])
+
+    def __getitem__(self, key):
+        return np.array(self.data[key])
+
+    def __array__(self, dtype=None, copy=None):
+        # only a memory mapped data set of the requested dtype can be returned without a copy.
+        mapped = isinstance(self.data, np.memmap)
+        if copy is False and not (mapped and (dtype is None or np.dtype(dtype) == self.data.dtype)):
+            raise ValueError("The data set can not be converted to an array without a copy.")
+        data = np.asarray(self.data[...], dtype=dtype)
+        return data.copy() if copy and mapped else data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """ close the file, the view can not be read afterwards."""
+        self.data = None
+        self.h5file.close()
+
+    def index(self, **coords):
+        """Convert physical coordinates to an index of the data set.
+
+        :param coords: name=value selects the closest point (the axis is dropped),
+                       name=(min, max) selects all the points in the closed interval.
+        :return: tuple of int and slices.
+        """
+        key = [slice(None)] * self.ndim
+        for name, value in coords.items():
+            if name not in self.names:
+                raise ValueError("Unknown coordinate: " + str(name) + ", expected one of " + str(self.names))
+            axis = self.names.index(name)
+            scale = self.scales[axis]
+            if len(scale) == 0:
+                raise ValueError("The file has no scale for the coordinate: " + str(name))
+
+            if np.ndim(value) == 0:
+                key[axis] = int(np.argmin(np.abs(scale - value)))
+            else:
+                inside = np.nonzero((scale >= value[0]) & (scale <= value[1]))[0]
+                if len(inside) == 0:
+                    raise ValueError("No " + str(name) + " in the interval " + str(tuple(value)))
+                key[axis] = slice(inside[0], inside[-1] + 1)
+        return tuple(key)
+
+    def sel(self, **coords):
+        """Read the hyperslab at physical coordinates, see index.
+
+        :return: data (numpy array).
+        """
+        return self[self.index(**coords)]
+
+
+def rdh5(h5_filename, lazy=False):
+    """Read a PSI hdf5 file.
+
+    :param h5_filename: hdf5 filename.
+    :param lazy: if True, f is an H5Data view and nothing is read until it is sliced (close it when done).
+    :return: x, y, z (scales), f (data).
+    """
+    if lazy:
+        f = H5Data(h5_filename)
+        return (f.x, f.y, f.z, f)
+
     x = np.array([])
     y = np.array([])
     z = np.array([])
@@ -34,43 +152,63 @@ def rdh5(h5_filename):
 
     return (x,y,z,f)
 
-def rdhdf(hdf_filename):
+# open hdf4 files kept by rdhdf(..., keep_open=True), see close_hdf.
+_OPEN_SD = {}
+
+
+def rdhdf(hdf_filename, start=None, count=None, stride=None, keep_open=False, cache=False):
+    """Read a PSI hdf4 or hdf5 file, or only a hyperslab of it.
+
+    ex: rdhdf("vr002.hdf", start=[0, 0, 0], count=[1, nt, np]) reads the first radial shell of a MAS cube.
+
+    :param hdf_filename: hdf4 or hdf5 (.h5) filename.
+    :param start: first index along each dimension, default = 0.
+    :param count: number of values along each dimension, default = up to the end.
+    :param stride: sampling interval along each dimension, default = 1.
+    :param keep_open: if True, keep the hdf4 file open so the next reads do not reopen it (see close_hdf).
+    :param cache: if True (or a cache directory), an hdf4 file is converted once to an hdf5 copy, which is
+                  memory mapped by the next reads. f is then a read-only array. The copies are kept out of
+                  the data directory, in $PSIHDF_CACHE_ROOT or <tmp>/psihdf_cache by default.
+    :return: x, y, z (scales, sliced like the data), f (data).
+    """
+    if cache and not hdf_filename.endswith('h5'):
+        cache_root = None if cache is True else cache
+        return _read_h5_view(_hdf_sidecar(hdf_filename, cache_root), start, count, stride)
 
     if (hdf_filename.endswith('h5')):
-        x,y,z,f = rdh5(hdf_filename)
-        return (x,y,z,f)
+        if start is None and count is None and stride is None:
+            x,y,z,f = rdh5(hdf_filename)
+            return (x,y,z,f)
+        return _read_h5_view(H5Data(hdf_filename), start, count, stride)
 
     x = np.array([])
     y = np.array([])
     z = np.array([])
     f = np.array([])
 
-    # Open the HDF file
-    sd_id = h4.SD(hdf_filename)
+    # Open the HDF file, or reuse the open one.
+    sd_id, sds_id, scales = _open_hdf(hdf_filename, keep_open)
 
-    #Read dataset.  In all PSI hdf4 files, the
-    #data is stored in "Data-Set-2":
-    sds_id = sd_id.select('Data-Set-2')
-    f = sds_id.get()
+    #Read dataset (hyperslab).
+    start, count, stride = _hyperslab(sds_id.info()[2], start, count, stride)
+    f = sds_id.get(start=start, count=count, stride=stride)
 
     #Get number of dimensions:
     ndims = np.ndim(f)
 
-    # Get the scales. Check if theys exist by looking at the 3rd
-    # element of dim.info(). 0 = none, 5 = float32, 6 = float64.
-    # see http://pysclint.sourceforge.net/pyhdf/pyhdf.SD.html#SD
-    # and http://pysclint.sourceforge.net/pyhdf/pyhdf.SD.html#SDC
+    # Slice the scales like the data.
+    key = _hyperslab_slices(start, count, stride)
     for i in range(0,ndims):
-        dim = sds_id.dim(i)
-        if dim.info()[2] != 0:
+        if len(scales[i]) != 0:
             if i == 0:
-                x = dim.getscale()
+                x = scales[i][key[i]]
             elif i == 1:
-                y = dim.getscale()
+                y = scales[i][key[i]]
             elif i == 2:
-                z = dim.getscale()
+                z = scales[i][key[i]]
 
-    sd_id.end()
+    if os.path.abspath(hdf_filename) not in _OPEN_SD:
+        sd_id.end()
 
     x = np.array(x)
     y = np.array(y)
@@ -79,53 +217,270 @@ def rdhdf(hdf_filename):
 
     return (x,y,z,f)
 
-def rdhdf_1d(hdf_filename):
 
-    x,y,z,f = rdhdf(hdf_filename)
+def close_hdf(hdf_filename=None):
+    """Close an hdf4 file kept open by rdhdf(..., keep_open=True).
+
+    :param hdf_filename: hdf4 filename, default = close all the open files.
+    """
+    keys = list(_OPEN_SD) if hdf_filename is None else [os.path.abspath(hdf_filename)]
+    for key in keys:
+        if key in _OPEN_SD:
+            _, sd_id, sds_id, _ = _OPEN_SD.pop(key)
+            sds_id.endaccess()
+            sd_id.end()
+
+
+def _hdf_sidecar(hdf_filename, cache_root=None):
+    """Return an H5Data view of the hdf5 sidecar of an hdf4 file. The sidecar is written on the first
+    read and again when the mtime or the size of the hdf4 file changes.
+
+    The sidecars live in a separate cache directory, named after a hash of the absolute source path, so they
+    never show up in the data directory (psipy globs the variable files, e.g. vr*).
+    """
+    if cache_root is None:
+        cache_root = os.environ.get("PSIHDF_CACHE_ROOT", os.path.join(tempfile.gettempdir(), 'psihdf_cache'))
+    os.makedirs(cache_root, exist_ok=True)
+    path = os.path.abspath(hdf_filename)
+    key = hashlib.sha1(path.encode()).hexdigest()[:16]
+    sidecar = os.path.join(cache_root, key + '_' + os.path.basename(path) + '.h5')
+    stat = os.stat(hdf_filename)
+    try:
+        with h5.File(sidecar, 'r') as h5file:
+            fresh = h5file.attrs.get('source_mtime_ns') == stat.st_mtime_ns and \
+                    h5file.attrs.get('source_size') == stat.st_size
+    except OSError:
+        fresh = False
+
+    if not fresh:
+        x,y,z,f = rdhdf(hdf_filename)
+        # write to a temporary file so a concurrent reader never sees a partial sidecar.
+        tmp = sidecar + '.' + str(os.getpid())
+        with h5.File(tmp, 'w') as h5file:
+            h5file.create_dataset("Data", data=f)
+            # keep the precision of the scales.
+            _write_h5_scales(h5file, x, y, z, np.result_type(x, y, z), np.ndim(f))
+            h5file.attrs['source_mtime_ns'] = stat.st_mtime_ns
+            h5file.attrs['source_size'] = stat.st_size
+        os.replace(tmp, sidecar)
+    return H5Data(sidecar)
+
+
+def _read_h5_view(view, start=None, count=None, stride=None):
+    """ return the scales and the data (memory map of a full contiguous read) of an H5Data view and close it."""
+    with view:
+        if start is None and count is None and stride is None:
+            key = tuple(slice(None) for _ in range(view.ndim))
+            f = view.data if isinstance(view.data, np.memmap) else view[key]
+        else:
+            key = _hyperslab_slices(*_hyperslab(view.shape, start, count, stride))
+            f = view[key]
+        scales = [view.scales[i][key[i]] if len(view.scales[i]) != 0 else view.scales[i] for i in range(view.ndim)]
+    scales += [np.array([])] * (3 - len(scales))
+    return (scales[0], scales[1], scales[2], f)
+
+
+def _open_hdf(hdf_filename, keep_open=False):
+    """ return the SD, the Data-Set-2 data set and the scales of an hdf4 file, reopened if it changed on disk."""
+    key = os.path.abspath(hdf_filename)
+    stat = os.stat(key)
+    version = (stat.st_mtime_ns, stat.st_size)
+    if key in _OPEN_SD:
+        if _OPEN_SD[key][0] == version:
+            return _OPEN_SD[key][1:]
+        close_hdf(hdf_filename)
+
+    sd_id = h4.SD(hdf_filename)
+
+    #Read dataset.  In all PSI hdf4 files, the
+    #data is stored in "Data-Set-2":
+    sds_id = sd_id.select('Data-Set-2')
+
+    # Get the scales. Check if theys exist by looking at the 3rd
+    # element of dim.info(). 0 = none, 5 = float32, 6 = float64.
+    # see http://pysclint.sourceforge.net/pyhdf/pyhdf.SD.html#SD
+    # and http://pysclint.sourceforge.net/pyhdf/pyhdf.SD.html#SDC
+    scales = []
+    for i in range(0, sds_id.info()[1]):
+        dim = sds_id.dim(i)
+        scales.append(np.array(dim.getscale()) if dim.info()[2] != 0 else np.array([]))
+
+    if keep_open:
+        _OPEN_SD[key] = (version, sd_id, sds_id, scales)
+    return sd_id, sds_id, scales
+
+
+def _hyperslab(shape, start=None, count=None, stride=None):
+    """ return start, count and stride (lists of int) of a hyperslab of an array of this shape."""
+    shape = np.atleast_1d(shape)
+    start = np.zeros_like(shape) if start is None else np.atleast_1d(start)
+    stride = np.ones_like(shape) if stride is None else np.atleast_1d(stride)
+    if count is None:
+        count = (shape - start + stride - 1) // stride
+    count = np.atleast_1d(count)
+
+    if not (len(start) == len(count) == len(stride) == len(shape)):
+        raise ValueError("start, count and stride must have one value per dimension: " + str(len(shape)))
+    if np.any(start < 0) or np.any(stride < 1) or np.any(count < 1) or np.any(start + (count - 1) * stride >= shape):
+        raise ValueError("Hyperslab out of bounds: start=" + str(start.tolist()) + ", count=" + str(count.tolist()) +
+                         ", stride=" + str(stride.tolist()) + ", shape=" + str(shape.tolist()))
+    return [int(v) for v in start], [int(v) for v in count], [int(v) for v in stride]
+
+
+def _hyperslab_slices(start, count, stride):
+    """ return the numpy index of a hyperslab."""
+    return tuple(slice(s, s + (c - 1) * st + 1, st) for s, c, st in zip(start, count, stride))
+
+def rdhdf_1d(hdf_filename, **kwargs):
+
+    x,y,z,f = rdhdf(hdf_filename, **kwargs)
 
     return (x,f)
 
-def rdhdf_2d(hdf_filename):
+def rdhdf_2d(hdf_filename, **kwargs):
 
-    x,y,z,f = rdhdf(hdf_filename)
+    x,y,z,f = rdhdf(hdf_filename, **kwargs)
 
     if (hdf_filename.endswith('h5')):
         return(x,y,f)
     return (y,x,f)
 
-def rdhdf_3d(hdf_filename):
+def rdhdf_3d(hdf_filename, **kwargs):
 
-    x,y,z,f = rdhdf(hdf_filename)
+    x,y,z,f = rdhdf(hdf_filename, **kwargs)
     if (hdf_filename.endswith('h5')):
         return(x,y,z,f)
 
     return (z,y,x,f)
 
-def wrh5(h5_filename, x, y, z, f):
+def wrh5(h5_filename, x, y, z, f, chunks=None, compression=None, compression_opts=None, shuffle=False, dtype=None):
+    """Write a PSI hdf5 file.
+
+    ex: wrh5("hux_f.h5", r, t, p, v, chunks=(1, nt, np), compression="gzip", dtype=np.float32)
+        stores one radial shell per compressed chunk in single precision.
+
+    :param h5_filename: hdf5 filename.
+    :param x, y, z: scales of each dimension (None or empty arrays for no scale).
+    :param f: data.
+    :param chunks: chunk shape, True for automatic chunking, default = None (contiguous).
+    :param compression: h5py compression filter, ex: "gzip" or "lzf", default = None.
+    :param compression_opts: compression settings, ex: gzip level (0-9).
+    :param shuffle: bool, enable the shuffle filter (usually improves the compression of floats).
+    :param dtype: data type written to the file, ex: np.float32, default = type of f.
+    """
+    f = np.asarray(f) if dtype is None else np.asarray(f, dtype=dtype)
 
     h5file = h5.File(h5_filename, 'w')
 
     # Create the dataset (Data is the name used by the psi data)).
-    h5file.create_dataset("Data", data=f)
+    h5file.create_dataset("Data", data=f, chunks=chunks, compression=compression,
+                          compression_opts=compression_opts, shuffle=shuffle)
+
+    _write_h5_scales(h5file, x, y, z, f.dtype, np.ndim(f))
+
+    # Close the file:
+    h5file.close()
 
+
+class H5SliceWriter:
+    """Append slices to the Data set of a PSI hdf5 file along its first dimension, e.g. the radial
+    slices yielded by code.hux_propagation.iter_hux_f_model, without holding the cube in memory.
+
+    ex: with H5SliceWriter("hux_f.h5", compression="gzip") as writer:
+            for v in iter_hux_f_model(v0, dr_vec, dp_vec):
+                writer.append(v)
+            writer.set_scales(r_vec, p_vec)
+
+    :param h5_filename: hdf5 filename.
+    :param chunks: chunk shape, default = one slice per chunk.
+    :param compression: h5py compression filter, ex: "gzip" or "lzf", default = None.
+    :param compression_opts: compression settings, ex: gzip level (0-9).
+    :param shuffle: bool, enable the shuffle filter.
+    :param dtype: data type written to the file, default = np.float32.
+    """
+
+    def __init__(self, h5_filename, chunks=None, compression=None, compression_opts=None, shuffle=False,
+                 dtype=np.float32):
+        self.h5file = h5.File(h5_filename, 'w')
+        self.options = {"chunks": chunks, "compression": compression, "compression_opts": compression_opts,
+                        "shuffle": shuffle, "dtype": dtype}
+        self.dset = None
+        self.scales = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # keep the exception that stopped the stream, the scales are not checked.
+        self.close(check_scales=exc_type is None)
+
+    def append(self, f_slice):
+        """ write one slice at the end of the data set."""
+        f_slice = np.asarray(f_slice)
+        if self.dset is None:
+            options = dict(self.options)
+            if options["chunks"] is None:
+                options["chunks"] = (1,) + f_slice.shape
+            self.dset = self.h5file.create_dataset("Data", shape=(0,) + f_slice.shape,
+                                                   maxshape=(None,) + f_slice.shape, **options)
+        elif f_slice.shape != self.dset.shape[1:]:
+            raise ValueError("Slice shape " + str(f_slice.shape) + " does not match " + str(self.dset.shape[1:]))
+
+        n = self.dset.shape[0]
+        self.dset.resize(n + 1, axis=0)
+        self.dset[n] = f_slice
+
+    def extend(self, slices):
+        """Write every slice of an iterable (e.g. an iter_* generator).
+
+        :return: number of slices written.
+        """
+        count = 0
+        for f_slice in slices:
+            self.append(f_slice)
+            count += 1
+        return count
+
+    def set_scales(self, x=None, y=None, z=None):
+        """ scales of each dimension, written when the file is closed (x has one value per slice)."""
+        self.scales = (x, y, z)
+
+    def close(self, check_scales=True):
+        """Write the scales and close the file, the file is closed even if the scales can not be written.
+
+        :param check_scales: if True, raise ValueError if x does not have one value per slice,
+                             otherwise the scales are not written in that case.
+        """
+        if not self.h5file:
+            return
+        try:
+            if self.dset is not None and self.scales is not None:
+                x, y, z = (np.array([]) if scale is None else np.asarray(scale) for scale in self.scales)
+                if len(x) in (0, self.dset.shape[0]):
+                    _write_h5_scales(self.h5file, x, y, z, self.dset.dtype, self.dset.ndim)
+                elif check_scales:
+                    raise ValueError("x has " + str(len(x)) + " values for " + str(self.dset.shape[0]) + " slices")
+        finally:
+            self.h5file.close()
+
+
+def _write_h5_scales(h5file, x, y, z, dtype, ndims):
+    """ attach the scales x, y, z to the Data set of an open hdf5 file."""
     # Make sure the scales are desired by checking x type, which can
     # be None or None converted by np.asarray (have to trap seperately)
     if x is None: 
-        x = np.array([], dtype=f.dtype)
-        y = np.array([], dtype=f.dtype)
-        z = np.array([], dtype=f.dtype)
+        x = np.array([], dtype=dtype)
+        y = np.array([], dtype=dtype)
+        z = np.array([], dtype=dtype)
     if x.any() == None:
-        x = np.array([], dtype=f.dtype)
-        y = np.array([], dtype=f.dtype)
-        z = np.array([], dtype=f.dtype)
+        x = np.array([], dtype=dtype)
+        y = np.array([], dtype=dtype)
+        z = np.array([], dtype=dtype)
 
     # Make sure scales are the same precision as data.
-    x=x.astype(f.dtype)
-    y=y.astype(f.dtype)
-    z=z.astype(f.dtype)
-
-    #Get number of dimensions:
-    ndims = np.ndim(f)
+    x=x.astype(dtype)
+    y=y.astype(dtype)
+    z=z.astype(dtype)
 
     #Set the scales:
     for i in range(0,ndims):
@@ -145,15 +500,15 @@ def wrh5(h5_filename, x, y, z, f):
             h5file['Data'].dims[2].attach_scale(dim)
             h5file['Data'].dims[2].label = 'dim3'
 
-    # Close the file:
-    h5file.close()
-
 def wrhdf(hdf_filename, x, y, z, f):
 
     if (hdf_filename.endswith('h5')):
         wrh5(hdf_filename, x, y, z, f)
         return
 
+    # Close the file if rdhdf kept it open.
+    close_hdf(hdf_filename)
+
     # Create an HDF file
     sd_id = h4.SD(hdf_filename, h4.SDC.WRITE | h4.SDC.CREATE | h4.SDC.TRUNC)
 
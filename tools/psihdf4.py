@@ -1,66 +1,78 @@
+import os
+
 import numpy as np
 from pyhdf.SD import *
 
-def rdhdf(hdf_filename):
+# the open files kept by rdhdf(..., keep_open=True) are shared with tools.psihdf, see close_hdf.
+from tools.psihdf import _OPEN_SD, _open_hdf, _hyperslab, _hyperslab_slices, close_hdf
+
+
+def rdhdf(hdf_filename, start=None, count=None, stride=None, keep_open=False):
     """
-    Read an HDF4 file and return the scales and data values.
+    Read an HDF4 file, or only a hyperslab of it, and return the scales and data values.
 
     str: hdf_filename
         HDF4 filename.
+    list: start, count, stride
+        First index (default 0), number of values (default up to the end) and
+        sampling interval (default 1) along each dimension.
+    bool: keep_open
+        Keep the file open so the next reads do not reopen it (see close_hdf).
 
     tuple:
-        List of scale and data values.
+        List of scale (sliced like the data) and data values.
     """
     x = np.array([])
     y = np.array([])
     z = np.array([])
     f = np.array([])
 
-    # Open the HDF file
-    sd_id = SD(hdf_filename)
+    # Open the HDF file, or reuse the open one.
+    sd_id, sds_id, scales = _open_hdf(hdf_filename, keep_open)
+
+    #Read dataset (hyperslab).
+    start, count, stride = _hyperslab(sds_id.info()[2], start, count, stride)
+    f = sds_id.get(start=start, count=count, stride=stride)
 
-    #Read dataset.  In all PSI hdf4 files, the 
-    #data is stored in "Data-Set-2":
-    sds_id = sd_id.select('Data-Set-2')
-    f = sds_id.get()
-    
     #Get number of dimensions:
     ndims = np.ndim(f)
-    
-    #Get the scales:
+
+    #Slice the scales like the data:
+    key = _hyperslab_slices(start, count, stride)
     for i in range(0,ndims):
-        dim = sds_id.dim(i)
+        scale = scales[i][key[i]]
         if i == 0:
-            x = dim.getscale()
+            x = scale
         elif i == 1:
-            y = dim.getscale()
-        elif i == 2: 
-            z = dim.getscale()
+            y = scale
+        elif i == 2:
+            z = scale
 
-    sd_id.end()
+    if os.path.abspath(hdf_filename) not in _OPEN_SD:
+        sd_id.end()
 
     x = np.array(x)
     y = np.array(y)
     z = np.array(z)
-    f = np.array(f) 
+    f = np.array(f)
 
     return (x,y,z,f)
 
-def rdhdf_1d(hdf_filename):
+def rdhdf_1d(hdf_filename, **kwargs):
 
-    x,y,z,f = rdhdf(hdf_filename)
+    x,y,z,f = rdhdf(hdf_filename, **kwargs)
 
     return (x,f)
 
-def rdhdf_2d(hdf_filename):
+def rdhdf_2d(hdf_filename, **kwargs):
 
-    x,y,z,f = rdhdf(hdf_filename)
+    x,y,z,f = rdhdf(hdf_filename, **kwargs)
 
     return (y,x,f)
 
-def rdhdf_3d(hdf_filename):
+def rdhdf_3d(hdf_filename, **kwargs):
 
-    x,y,z,f = rdhdf(hdf_filename)
+    x,y,z,f = rdhdf(hdf_filename, **kwargs)
 
     return (z,y,x,f)
 
@@ -74,6 +86,9 @@ def wrhdf(hdf_filename, x, y, z, f):
 
     """
 
+    # Close the file if rdhdf kept it open.
+    close_hdf(hdf_filename)
+
     # Create an HDF file
     sd_id = SD(hdf_filename, SDC.WRITE | SDC.CREATE | SDC.TRUNC)
 